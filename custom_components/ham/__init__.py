@@ -13,6 +13,7 @@ from .const import VERSION
 from .const import *
 from .configuration_transformer import HomeAutomationManagerConfigurationTransformer
 from .ham_data import HomeAutomationManagerData
+from .storage import HomeAutomationManagerStorage
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -30,13 +31,24 @@ def setup(hass, config):
         events = conf.get(CONF_EVENTS)
         trackers = conf.get(CONF_TRACKERS)
         scenes = conf.get(CONF_SCENES)
+        rules = conf.get(CONF_RULES)
+        options = {
+            CONF_HISTORY_SIZE: conf.get(CONF_HISTORY_SIZE),
+            CONF_COMPACT_ATTRIBUTES: conf.get(CONF_COMPACT_ATTRIBUTES),
+            CONF_CATCH_UP: conf.get(CONF_CATCH_UP),
+            CONF_TRACE_INTERVAL: conf.get(CONF_TRACE_INTERVAL)
+        }
         default_profile_parts = default_profile[CONF_PARTS]
 
+        storage = HomeAutomationManagerStorage(hass)
+        stored_configuration = storage.load()
+
         ham_configuration_transformer = HomeAutomationManagerConfigurationTransformer(default_profile_parts, profiles,
-                                                                                      events, trackers, scenes)
+                                                                                      events, trackers, scenes, rules,
+                                                                                      stored_configuration)
         configuration = ham_configuration_transformer.get_configuration()
 
-        data = HomeAutomationManagerData(hass, scan_interval, configuration)
+        data = HomeAutomationManagerData(hass, scan_interval, configuration, options, storage)
 
         was_initialized = data.was_initialized()
 
@@ -46,7 +58,7 @@ def setup(hass, config):
         return was_initialized
 
     except Exception as ex:
-        _LOGGER.error('Error while initializing HAM, exception: {}'.format(str(ex)))
+        _LOGGER.error('Error while initializing HAM, exception: %s', ex)
 
         hass.components.persistent_notification.create(
             f'Error: {str(ex)}<br />You will need to restart hass after fixing.',
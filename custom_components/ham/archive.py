@@ -0,0 +1,85 @@
+"""Archive of past events, appended to a JSON lines file in the configuration directory."""
+import json
+import logging
+import os
+import threading
+from collections import deque
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerArchive:
+    """Past events retired from the live configuration, appended to a JSON lines file."""
+
+    def __init__(self, file_path):
+        self._file_path = file_path
+        self._lock = threading.Lock()
+        self._archived_ids = None
+
+    def load_archived_ids(self):
+        """Ids of the archived events, loaded once to skip events configured again (YAML) on restart."""
+        if self._archived_ids is None:
+            self._archived_ids = set()
+
+            for record in self.read_records():
+                self._archived_ids.add(record[ATTR_EVENT_ID])
+
+        return self._archived_ids
+
+    def read_records(self):
+        if not os.path.exists(self._file_path):
+            return
+
+        with open(self._file_path, 'r') as file:
+            for line in file:
+                if line.strip() == '':
+                    continue
+
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    _LOGGER.warning('Skipping invalid line of %s', self._file_path)
+
+    def append(self, records):
+        """Append records of retired events, already archived events are skipped, returns the number archived."""
+        with self._lock:
+            archived_ids = self.load_archived_ids()
+            lines = []
+
+            for record in records:
+                if record[ATTR_EVENT_ID] not in archived_ids:
+                    archived_ids.add(record[ATTR_EVENT_ID])
+
+                    lines.append(json.dumps(record))
+
+            if len(lines) > 0:
+                with open(self._file_path, 'a') as file:
+                    file.write('\n'.join(lines) + '\n')
+
+        return len(lines)
+
+    def query(self, profile=None, title=None, since=None, until=None, limit=None):
+        """Return archived events matching the filters (by last date), latest archived first."""
+        since = None if since is None else since.isoformat()
+        until = None if until is None else until.isoformat()
+        records = deque(maxlen=limit)
+
+        with self._lock:
+            for record in self.read_records():
+                if profile is not None and record[CONF_PROFILE_NAME] != profile:
+                    continue
+
+                if title is not None and record[CONF_EVENT_TITLE] != title:
+                    continue
+
+                if since is not None and record[ATTR_LAST_DATE] < since:
+                    continue
+
+                if until is not None and record[ATTR_LAST_DATE] > until:
+                    continue
+
+                records.append(record)
+
+        return list(reversed(records))
@@ -0,0 +1,51 @@
+"""Sunrise and sunset times by the sunrise equation, for sun relative day parts."""
+import math
+from datetime import date, datetime, timedelta, timezone
+
+J2000 = 2451545.0
+J2000_DATE = date(2000, 1, 1)
+J2000_DATE_TIME = datetime(2000, 1, 1, 12, tzinfo=timezone.utc)
+
+EARTH_OBLIQUITY = 23.4397
+SUN_ALTITUDE = -0.833
+
+
+def get_sun_times(event_date, latitude, longitude):
+    """
+    Calculate sunrise and sunset (UTC) of a date using the sunrise equation,
+    returns None instead of the times when the sun does not rise or set at that date (polar day / night).
+    """
+    days = (event_date - J2000_DATE).days - longitude / 360
+
+    mean_anomaly = (357.5291 + 0.98560028 * days) % 360
+    mean_anomaly_rad = math.radians(mean_anomaly)
+
+    center = 1.9148 * math.sin(mean_anomaly_rad) + \
+        0.0200 * math.sin(2 * mean_anomaly_rad) + \
+        0.0003 * math.sin(3 * mean_anomaly_rad)
+
+    ecliptic_longitude = math.radians((mean_anomaly + center + 180 + 102.9372) % 360)
+
+    transit = J2000 + days + 0.0053 * math.sin(mean_anomaly_rad) - 0.0069 * math.sin(2 * ecliptic_longitude)
+
+    declination_sin = math.sin(ecliptic_longitude) * math.sin(math.radians(EARTH_OBLIQUITY))
+    declination_cos = math.cos(math.asin(declination_sin))
+
+    latitude_rad = math.radians(latitude)
+
+    hour_angle_cos = (math.sin(math.radians(SUN_ALTITUDE)) - math.sin(latitude_rad) * declination_sin) / \
+                     (math.cos(latitude_rad) * declination_cos)
+
+    if hour_angle_cos < -1 or hour_angle_cos > 1:
+        return None, None
+
+    hour_angle = math.degrees(math.acos(hour_angle_cos))
+
+    sunrise = julian_to_datetime(transit - hour_angle / 360)
+    sunset = julian_to_datetime(transit + hour_angle / 360)
+
+    return sunrise, sunset
+
+
+def julian_to_datetime(julian_date):
+    return J2000_DATE_TIME + timedelta(days=julian_date - J2000)
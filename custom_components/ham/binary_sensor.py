@@ -1,9 +1,5 @@
-import asyncio
-
 import logging
 
-from homeassistant.core import callback
-from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.const import (STATE_ON)
 from homeassistant.components.binary_sensor import (BinarySensorDevice)
 from homeassistant.components.binary_sensor import DOMAIN as BINARY_SENSOR_DOMAIN
@@ -30,7 +26,7 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
         sensor_name = f'Profile {profile_name}'
         attributes = ham_data.get_profile_data(profile_name)
 
-        _LOGGER.debug(f'{sensor_name} - data: {attributes}')
+        _LOGGER.debug('%s - data: %s', sensor_name, attributes)
 
         sensor = HomeAutomationManagerBinarySensor(sensor_name, attributes, ham_data, hass)
 
@@ -84,28 +80,38 @@ class HomeAutomationManagerBinarySensor(BinarySensorDevice):
         """Return the state attributes."""
         return self._attributes
 
-    @asyncio.coroutine
-    def async_added_to_hass(self):
-        """Register callbacks."""
-        async_dispatcher_connect(self.hass, SIGNAL_UPDATE_HAM, self._update_callback)
+    @property
+    def should_poll(self):
+        """No polling needed, state is updated once HAM is refreshed."""
+        return False
+
+    async def async_added_to_hass(self):
+        """Register to the coordinator, states of all HAM entities are published together."""
+        self.hass.data[DATA_HAM].get_coordinator().register(self)
 
-    @callback
-    def _update_callback(self):
-        """Call update method."""
-        self.async_schedule_update_ha_state(True)
+    async def async_will_remove_from_hass(self):
+        """Unregister from the coordinator."""
+        self.hass.data[DATA_HAM].get_coordinator().unregister(self)
 
     def update(self):
         """Get the latest data."""
+        self.refresh(self._ham_data.get_snapshot())
+
+    def refresh(self, snapshot):
+        """Get the latest data of the snapshot, returns whether state or attributes were changed."""
         is_on = False
+        attributes = self._attributes
 
         if self._ham_data is not None:
-            current_profile = self._ham_data.get_current_profile()
-            is_away = self._ham_data.get_is_away()
+            current_profile = snapshot.profile
+            is_away = snapshot.is_away
             sensor_name = self._sensor_name.replace("Profile ", "")
 
+            attributes = self._ham_data.get_profile_data(sensor_name)
+
             if current_profile is not None and is_away is not None:
                 if sensor_name == current_profile:
-                    _LOGGER.debug(f'{current_profile} equals {sensor_name}')
+                    _LOGGER.debug('%s equals %s', current_profile, sensor_name)
                     is_on = True
 
                 elif sensor_name == DEFAULT_PROFILE:
@@ -117,6 +123,13 @@ class HomeAutomationManagerBinarySensor(BinarySensorDevice):
                     is_on = True
 
                 else:
-                    _LOGGER.debug('{sensor_name} is inactive')
+                    _LOGGER.debug('%s is inactive', sensor_name)
+            else:
+                is_on = self._is_on
+
+        is_changed = is_on != self._is_on or attributes is not self._attributes
+
+        self._is_on = is_on
+        self._attributes = attributes
 
-                self._is_on = is_on
+        return is_changed
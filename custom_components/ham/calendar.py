@@ -0,0 +1,87 @@
+import logging
+
+import homeassistant.util.dt as dt_util
+from homeassistant.components.calendar import CalendarEventDevice
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+DEPENDENCIES = [DOMAIN]
+
+
+def setup_platform(hass, config, add_entities, discovery_info=None):
+    """Setup the calendar platform."""
+    ham_data = hass.data.get(DATA_HAM)
+    if not ham_data:
+        return
+
+    _LOGGER.debug('Loading HAM Calendar')
+
+    calendar = HomeAutomationManagerCalendar(CALENDAR_NAME, ham_data)
+
+    add_entities([calendar], True)
+
+
+class HomeAutomationManagerCalendar(CalendarEventDevice):
+    """Representation of the events (profile overrides) occurrences as calendar."""
+
+    def __init__(self, calendar_name, ham_data):
+        """Initialize the calendar."""
+        self._calendar_name = calendar_name
+        self._name = f'{DOMAIN.upper()} {self._calendar_name}'
+        self._ham_data = ham_data
+        self._event = None
+        self._current_date = None
+
+    @property
+    def name(self):
+        """Return the name of the device."""
+        return self._name
+
+    @property
+    def friendly_name(self):
+        """Return the name of the device."""
+        return self._calendar_name
+
+    @property
+    def event(self):
+        """Return the current or next occurrence."""
+        return self._event
+
+    @property
+    def should_poll(self):
+        """No polling needed, state is updated once HAM is refreshed."""
+        return False
+
+    async def async_added_to_hass(self):
+        """Register to the coordinator, states of all HAM entities are published together."""
+        self.hass.data[DATA_HAM].get_coordinator().register(self)
+
+    async def async_will_remove_from_hass(self):
+        """Unregister from the coordinator."""
+        self.hass.data[DATA_HAM].get_coordinator().unregister(self)
+
+    async def async_get_events(self, hass, start_date, end_date):
+        """Return the occurrences within the range, sliced from the precomputed window."""
+        start = dt_util.as_local(start_date).date()
+        end = dt_util.as_local(end_date).date()
+
+        return self._ham_data.get_calendar_events(start, end)
+
+    def update(self):
+        """Get the latest data."""
+        self.refresh(self._ham_data.get_snapshot())
+
+    def refresh(self, snapshot):
+        """Get the latest data of the snapshot, returns whether the occurrence or the date were changed."""
+        event = self._ham_data.get_next_calendar_event(snapshot)
+        current_date_time = snapshot.date_time
+        current_date = None if current_date_time is None else current_date_time.date()
+
+        is_changed = event is not self._event or current_date != self._current_date
+
+        self._event = event
+        self._current_date = current_date
+
+        return is_changed
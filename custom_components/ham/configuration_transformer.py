@@ -6,21 +6,35 @@ https://home-assistant.io/components/ham/
 import logging
 
 from .const import *
+from .event_index import HomeAutomationManagerEventIndex, HomeAutomationManagerRecurrence, parse_event_date
+from .timeline import HomeAutomationManagerTimeline, parse_part_from
 
 _LOGGER = logging.getLogger(__name__)
 
 
 class HomeAutomationManagerConfigurationTransformer:
-    def __init__(self, default_profile_parts, profiles, events, trackers, scenes):
+    def __init__(self, default_profile_parts, profiles, events, trackers, scenes, rules=None,
+                 stored_configuration=None):
         self._raw_default_profile_parts = default_profile_parts
         self._raw_profiles = profiles
         self._raw_events = events
         self._raw_scenes = scenes
+        self._raw_rules = rules
+
+        if stored_configuration is None:
+            stored_configuration = {}
+
+        self._stored_events = stored_configuration.get(STORAGE_EVENTS, {})
+        self._stored_removed_events = set(stored_configuration.get(STORAGE_REMOVED_EVENTS, []))
+        self._stored_parts = stored_configuration.get(STORAGE_PARTS, {})
 
         self._trackers = trackers
         self._profiles = {}
         self._scenes = {}
-        self._events = {}
+        self._scene_matrix = {}
+        self._rules = []
+        self._events = HomeAutomationManagerEventIndex()
+        self._part_names = set()
         self._custom_profiles = []
         self._configuration = {}
         self._configuration_errors = None
@@ -31,11 +45,15 @@ class HomeAutomationManagerConfigurationTransformer:
         self.transform_profiles()
         self.transform_events()
         self.transform_scenes()
+        self.build_scene_matrix()
+        self.transform_rules()
 
         self._configuration = {
             CONF_PROFILES: self._profiles,
             CONF_TRACKERS: self._trackers,
             CONF_SCENES: self._scenes,
+            ATTR_SCENE_MATRIX: self._scene_matrix,
+            CONF_RULES: self._rules,
             CONF_EVENTS: self._events,
             ATTR_CONFIG_ERRORS: self._configuration_errors,
             ATTR_CUSTOM_PROFILES: self._custom_profiles
@@ -72,15 +90,17 @@ class HomeAutomationManagerConfigurationTransformer:
                 for profile in self._raw_profiles:
                     profile_name = profile[CONF_PROFILE_NAME]
                     parts = None
+                    part_times = {}
 
                     if CONF_PARTS in profile:
                         profile_parts = profile[CONF_PARTS]
 
-                        parts = self.transform_profile_parts(profile_name, profile_parts)
+                        parts, part_times = self.transform_profile_parts(profile_name, profile_parts)
 
                     self._profiles[profile_name] = {
                         CONF_PARTS: parts,
-                        CONF_EVENTS: {}
+                        CONF_EVENTS: {},
+                        ATTR_TIMELINE: HomeAutomationManagerTimeline(profile_name, part_times)
                     }
 
                     if profile_name not in SYSTEM_PROFILES:
@@ -91,6 +111,7 @@ class HomeAutomationManagerConfigurationTransformer:
 
     def transform_profile_parts(self, profile_name, profile_parts):
         transformed_parts = {}
+        part_times = {}
 
         try:
             if profile_parts is not None:
@@ -101,88 +122,263 @@ class HomeAutomationManagerConfigurationTransformer:
                     if part_name in transformed_parts:
                         self.log_warn(f'{profile_name} already contains part {part_name}')
                     else:
-                        _LOGGER.info(f'Set part {profile_name} for profile {part_name} starting at: {part_from}')
+                        try:
+                            part_from_time = parse_part_from(part_from)
+                        except ValueError:
+                            self.log_warn(f'Part {part_name} of profile {profile_name} has invalid from {part_from}')
+                            continue
+
+                        _LOGGER.info('Set part %s for profile %s starting at: %s', profile_name, part_name, part_from)
 
                         transformed_parts[part_name] = part_from
+                        part_times[part_name] = part_from_time
+
+                        self._part_names.add(part_name)
+
+            stored_parts = self._stored_parts.get(profile_name, {})
+
+            for part_name in stored_parts:
+                part_from = stored_parts[part_name]
+
+                if part_from is None:
+                    _LOGGER.info('Remove part %s of profile %s (stored)', part_name, profile_name)
+
+                    transformed_parts.pop(part_name, None)
+                    part_times.pop(part_name, None)
+                else:
+                    _LOGGER.info('Set part %s of profile %s starting at: %s (stored)',
+                                 part_name, profile_name, part_from)
+
+                    transformed_parts[part_name] = part_from
+                    part_times[part_name] = parse_part_from(part_from)
+
+                    self._part_names.add(part_name)
         except Exception as ex:
             self.log_error(f'transform_profile_parts failed due to the following exception: {str(ex)}')
 
-        return transformed_parts
+        return transformed_parts, part_times
 
     def transform_events(self):
         try:
-            for event in self._raw_events:
+            transformed_events = []
+            raw_events = list(self._raw_events) + list(self._stored_events.values())
+
+            for event in raw_events:
                 event_title = event[CONF_EVENT_TITLE]
                 event_profile = event[CONF_PROFILE_NAME]
-                event_date = None
-                event_day = None
 
                 if event_profile not in self._profiles:
                     self.log_warn(f'Cannot add event {event_title} since profile {event_profile} is undefined')
                 elif event_profile in SYSTEM_PROFILES:
                     self.log_warn(f'Cannot add event {event_title} since profile {event_profile} is system profile')
                 else:
-                    event_date_time_key = None
+                    transformed_event = self.transform_event(event)
 
-                    if CONF_EVENT_DATE in event:
-                        event_date = event[CONF_EVENT_DATE]
-                        event_date_time_key = event_date
+                    if transformed_event is None:
+                        continue
 
-                    if CONF_EVENT_DAY in event:
-                        event_day = event[CONF_EVENT_DAY]
-                        event_date_time_key = event_day
+                    event_date_time_key = transformed_event[ATTR_EVENT_KEY]
+                    event_id = transformed_event[ATTR_EVENT_ID]
 
-                    event_id = f'{event_profile}.{event_title}.{event_date_time_key}'
+                    if event_id in self._stored_removed_events:
+                        _LOGGER.info('Skipping event %s at %s, removed (stored)', event_title, event_date_time_key)
+                        continue
 
                     events = self._profiles[event_profile][CONF_EVENTS]
 
-                    _LOGGER.info(f'Adding event {event_title} at {event_date_time_key} for profile {event_profile}')
+                    _LOGGER.info('Adding event %s at %s for profile %s',
+                                 event_title, event_date_time_key, event_profile)
 
-                    if event_date_time_key in self._events:
-                        self._events[event_date_time_key].append({
-                            CONF_PROFILE_NAME: event_profile,
-                            CONF_EVENT_TITLE: event_title
-                        })
-                    else:
-                        self._events[event_date_time_key] = [{
-                            CONF_PROFILE_NAME: event_profile,
-                            CONF_EVENT_TITLE: event_title
-                        }]
+                    if event_id in events and event_id in self._stored_events:
+                        _LOGGER.info('Skipping event %s at %s, already defined', event_title, event_date_time_key)
 
-                    if event_id in events:
+                    elif event_id in events:
                         self.log_warn(f'{event_profile} already contains event {event_title}')
                     else:
-                        _LOGGER.info(f'Set event {event_profile} for profile {event_title}')
+                        _LOGGER.info('Set event %s for profile %s', event_profile, event_title)
 
-                        events[event_id] = {
-                            CONF_EVENT_DAY: event_day,
-                            CONF_EVENT_DATE: event_date,
-                            CONF_EVENT_TITLE: event_title
-                        }
+                        transformed_events.append(transformed_event)
+
+                        events[event_id] = self.get_event_details(event)
+
+            self._events.build(transformed_events)
         except Exception as ex:
             self.log_error(f'transform_events failed due to the following exception: {str(ex)}')
 
+    def transform_event(self, event):
+        transformed_event = None
+
+        try:
+            transformed_event = self.create_event(event)
+        except ValueError as ex:
+            self.log_warn(f'Cannot add event {event[CONF_EVENT_TITLE]}, error: {str(ex)}')
+
+        return transformed_event
+
+    @staticmethod
+    def create_event(event):
+        """Create event for the index, raises ValueError for invalid date, range or rule."""
+        event_title = event[CONF_EVENT_TITLE]
+        event_profile = event[CONF_PROFILE_NAME]
+
+        transformed_event = {
+            CONF_PROFILE_NAME: event_profile,
+            CONF_EVENT_TITLE: event_title
+        }
+
+        if CONF_EVENT_START in event:
+            event_start = event[CONF_EVENT_START]
+            event_end = event.get(CONF_EVENT_END)
+            event_rule = event.get(CONF_EVENT_RRULE)
+
+            start_date = parse_event_date(event_start)
+            end_date = None if event_end is None else parse_event_date(event_end)
+            recurrence = None if event_rule is None else HomeAutomationManagerRecurrence(event_rule, start_date)
+
+            if end_date is not None and end_date < start_date:
+                raise ValueError(f'Event {event_title} ends before it starts')
+
+            event_date_time_key = f'{event_start}/{event_end or ""}'
+
+            if event_rule is not None:
+                event_date_time_key = f'{event_rule} {event_date_time_key}'
+
+            transformed_event[CONF_EVENT_START] = event_start
+            transformed_event[ATTR_EVENT_START_DATE] = start_date
+            transformed_event[ATTR_EVENT_END_DATE] = end_date
+            transformed_event[ATTR_EVENT_RECURRENCE] = recurrence
+
+        elif CONF_EVENT_DATE in event:
+            event_date_time_key = event[CONF_EVENT_DATE]
+
+            try:
+                parse_event_date(event_date_time_key)
+            except ValueError:
+                raise ValueError(f'Event {event_title} has invalid date {event_date_time_key}, expected YYYY-mm-DD')
+
+        else:
+            event_date_time_key = event[CONF_EVENT_DAY]
+
+        transformed_event[ATTR_EVENT_KEY] = event_date_time_key
+        transformed_event[ATTR_EVENT_ID] = f'{event_profile}.{event_title}.{event_date_time_key}'
+
+        return transformed_event
+
+    @staticmethod
+    def get_event_details(event):
+        event_details = {
+            CONF_EVENT_DAY: event.get(CONF_EVENT_DAY),
+            CONF_EVENT_DATE: event.get(CONF_EVENT_DATE),
+            CONF_EVENT_START: event.get(CONF_EVENT_START),
+            CONF_EVENT_END: event.get(CONF_EVENT_END),
+            CONF_EVENT_RRULE: event.get(CONF_EVENT_RRULE),
+            CONF_EVENT_TITLE: event[CONF_EVENT_TITLE]
+        }
+
+        return event_details
+
     def transform_scenes(self):
         try:
             for scene in self._raw_scenes:
                 scene_name = scene[CONF_SCENE_NAME]
                 scene_scripts = None
+                scene_key = scene_name
 
                 if CONF_SCENE_SCRIPT in scene:
                     scene_scripts = scene[CONF_SCENE_SCRIPT]
 
-                if scene_name not in SCENES_TYPES:
+                if CONF_SCENE_OCCUPANCY in scene:
+                    scene_key = self.get_key(scene_name, scene[CONF_SCENE_OCCUPANCY])
+
+                scene_profile = scene.get(CONF_PROFILE_NAME)
+
+                if scene_profile is not None:
+                    scene_key = self.get_key(scene_profile, scene_key)
+
+                if scene_name != AWAY_PROFILE and scene_name not in self._part_names:
                     self.log_warn(f'Scene {scene_name} is not invalid')
+                elif scene_name == AWAY_PROFILE and scene_key != scene_name:
+                    self.log_warn(f'Scene {scene_name} cannot be set per occupancy or profile')
+                elif scene_profile is not None and scene_profile not in self._profiles:
+                    self.log_warn(f'Cannot add scene {scene_name} since profile {scene_profile} is undefined')
+                elif scene_profile == AWAY_PROFILE:
+                    self.log_warn(f'Cannot add scene {scene_name} since profile {scene_profile} is system profile')
                 else:
-                    _LOGGER.info(f'Set scene {scene_name}')
+                    _LOGGER.info('Set scene %s', scene_key)
 
-                    self._scenes[scene_name] = {
+                    self._scenes[scene_key] = {
                         CONF_SCENE_NAME: scene_name,
                         CONF_SCENE_SCRIPT: scene_scripts
                     }
         except Exception as ex:
             self.log_error(f'transform_scenes failed due to the following exception: {str(ex)}')
 
+    def build_scene_matrix(self):
+        """
+        Resolve the scene of each profile, part and occupancy level once, by order of fallback:
+        scene of the profile and occupancy, scene of the profile, scene of the occupancy, scene of the part,
+        scene of the default profile (by occupancy, then of the part), otherwise the part name (no script).
+        """
+        try:
+            for profile_name in self._profiles:
+                if profile_name == AWAY_PROFILE:
+                    continue
+
+                for part_name in self._part_names:
+                    profile_part_key = self.get_key(profile_name, part_name)
+                    default_part_key = self.get_key(DEFAULT_PROFILE, part_name)
+
+                    for occupancy_level in OCCUPANCY_LEVELS:
+                        occupancy_key = self.get_key(part_name, occupancy_level)
+                        scene_keys = [self.get_key(profile_name, occupancy_key), profile_part_key,
+                                      occupancy_key, part_name,
+                                      self.get_key(DEFAULT_PROFILE, occupancy_key), default_part_key]
+                        scene = part_name
+
+                        for scene_key in scene_keys:
+                            if scene_key in self._scenes:
+                                scene = scene_key
+                                break
+
+                        self._scene_matrix[(profile_name, part_name, occupancy_level)] = scene
+        except Exception as ex:
+            self.log_error(f'build_scene_matrix failed due to the following exception: {str(ex)}')
+
+    def transform_rules(self):
+        try:
+            if self._raw_rules is not None:
+                for rule in self._raw_rules:
+                    rule_profile = rule[CONF_PROFILE_NAME]
+                    conditions = []
+
+                    for condition in rule[CONF_RULE_CONDITIONS]:
+                        entity_id = condition[CONF_ENTITY_ID]
+                        entity_domain = entity_id.split('.')[0]
+
+                        if entity_domain not in ALLOWED_RULE_DOMAINS:
+                            self.log_warn(f'Rule of {rule_profile} cannot depend on {entity_id}, not supported domain')
+                            conditions = None
+                            break
+
+                        conditions.append((entity_id, condition[CONF_RULE_STATE]))
+
+                    if conditions is None:
+                        continue
+
+                    if rule_profile not in self._profiles:
+                        self.log_warn(f'Cannot add rule since profile {rule_profile} is undefined')
+                    elif rule_profile == AWAY_PROFILE:
+                        self.log_warn(f'Cannot add rule since profile {rule_profile} is system profile')
+                    else:
+                        _LOGGER.info('Set rule %s for profile %s', conditions, rule_profile)
+
+                        self._rules.append({
+                            CONF_PROFILE_NAME: rule_profile,
+                            CONF_RULE_CONDITIONS: conditions
+                        })
+        except Exception as ex:
+            self.log_error(f'transform_rules failed due to the following exception: {str(ex)}')
+
     @staticmethod
     def get_key(prefix, suffix):
         key = f'{prefix}.{suffix}'
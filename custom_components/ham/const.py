@@ -1,7 +1,9 @@
 import voluptuous as vol
 
 from homeassistant.components.device_tracker import DOMAIN as DEVICE_TRACKER_DOMAIN
-from homeassistant.const import (CONF_NAME, STATE_OFF, STATE_NOT_HOME)
+from homeassistant.components.input_boolean import DOMAIN as INPUT_BOOLEAN_DOMAIN
+from homeassistant.components.switch import DOMAIN as SWITCH_DOMAIN
+from homeassistant.const import (CONF_ENTITY_ID, CONF_NAME, STATE_ON, STATE_HOME, STATE_UNKNOWN, STATE_UNAVAILABLE)
 from homeassistant.helpers import config_validation as cv
 
 from datetime import timedelta
@@ -10,7 +12,6 @@ VERSION = '1.0.5'
 
 DOMAIN = 'ham'
 DATA_HAM = 'data_ham'
-SIGNAL_UPDATE_HAM = "ham_update"
 DEFAULT_NAME = 'Home Automation Manager'
 
 GROUP_TRACKER_ICON = 'mdi:home'
@@ -20,20 +21,19 @@ ATTR_DATE = 'Date'
 ATTR_PROFILE = 'Profile'
 ATTR_PARTS_EVENTS = 'Parts_Events'
 ATTR_PARTS = 'Parts'
+ATTR_SUMMARY = 'Summary'
+ATTR_PARTS_COUNT = 'parts_count'
+ATTR_EVENTS_COUNT = 'events_count'
 ATTR_PART = 'Part'
 ATTR_EVENTS = 'Overrides of Today'
 ATTR_CUSTOM_PROFILES = 'custom_profiles'
 ATTR_CONFIG_ERRORS = 'configuration_errors'
+ATTR_TIMELINE = 'timeline'
+ATTR_SCENE_MATRIX = 'scene_matrix'
 
 DEFAULT_PROFILE = 'Default'
 AWAY_PROFILE = 'Away'
 
-DAY_PART_MORNING = 'Morning'
-DAY_PART_NOON = 'Noon'
-DAY_PART_AFTERNOON = 'Afternoon'
-DAY_PART_EVENING = 'Evening'
-DAY_PART_NIGHT = 'Night'
-
 DAY_SUNDAY = 'Sunday'
 DAY_MONDAY = 'Monday'
 DAY_TUESDAY = 'Tuesday'
@@ -48,29 +48,133 @@ CONF_PROFILES = 'profiles'
 CONF_PROFILE_NAME = 'profile'
 CONF_PROFILE_DEFAULT = 'default_profile'
 CONF_PROFILE_FROM = 'from'
+CONF_SUNRISE = 'sunrise'
+CONF_SUNSET = 'sunset'
 
 CONF_EVENTS = 'events'
 CONF_EVENT_DATE = 'date'
 CONF_EVENT_TIME = 'time'
 CONF_EVENT_TITLE = 'title'
 CONF_EVENT_DAY = 'day'
+CONF_EVENT_START = 'start'
+CONF_EVENT_END = 'end'
+CONF_EVENT_RRULE = 'rrule'
+
+EVENT_DATE_FORMAT = '%Y-%m-%d'
+
+ATTR_EVENT_KEY = 'key'
+ATTR_EVENT_ID = 'id'
+ATTR_EVENT_START_DATE = 'start_date'
+ATTR_EVENT_END_DATE = 'end_date'
+ATTR_EVENT_RECURRENCE = 'recurrence'
+
+RRULE_FREQ = 'FREQ'
+RRULE_INTERVAL = 'INTERVAL'
+RRULE_BY_DAY = 'BYDAY'
+RRULE_BY_MONTH_DAY = 'BYMONTHDAY'
+RRULE_BY_MONTH = 'BYMONTH'
+RRULE_UNTIL = 'UNTIL'
+
+RRULE_DAILY = 'DAILY'
+RRULE_WEEKLY = 'WEEKLY'
+RRULE_MONTHLY = 'MONTHLY'
+RRULE_YEARLY = 'YEARLY'
 
 CONF_TRACKERS = 'trackers'
 CONF_SCENES = 'scenes'
 CONF_SCENE_NAME = 'scene'
 CONF_SCENE_SCRIPT = 'script'
+CONF_SCENE_OCCUPANCY = 'occupancy'
+
+OCCUPANCY_EMPTY = 'Empty'
+OCCUPANCY_SINGLE = 'Single'
+OCCUPANCY_PARTIAL = 'Partial'
+OCCUPANCY_FULL = 'Full'
+
+CONF_RULES = 'rules'
+CONF_RULE_CONDITIONS = 'conditions'
+CONF_RULE_STATE = 'state'
+
+CONF_HISTORY_SIZE = 'history_size'
+CONF_COMPACT_ATTRIBUTES = 'compact_attributes'
+CONF_CATCH_UP = 'catch_up'
+CONF_TRACE_INTERVAL = 'trace_interval'
+
+CATCH_UP_LATEST = 'latest'
+CATCH_UP_REPLAY = 'replay'
 
 NOTIFICATION_ID = 'ham_notification'
 NOTIFICATION_TITLE = 'Home Automation Manager Setup'
+PROFILER_NOTIFICATION_ID = 'ham_profiler_notification'
+PROFILER_NOTIFICATION_TITLE = 'Home Automation Manager Profiling'
 
 SCAN_INTERVAL = timedelta(seconds=60)
+DEFAULT_HISTORY_SIZE = 100
+LATE_UPDATE_THRESHOLD = timedelta(seconds=10)
+TRANSITION_PREPARE_LEAD_TIME = timedelta(seconds=30)
+TRANSITION_LATENCY_BOUND = timedelta(seconds=1)
+TRANSITION_LATENCY_TIMEOUT = timedelta(seconds=60)
+
+CALENDAR_NAME = 'Schedule'
+CALENDAR_WINDOW_DAYS = 90
+
+TRACE_STEP_RESOLVE = 'resolve'
+TRACE_STEP_CALENDAR = 'calendar'
+TRACE_STEP_SCENES = 'scenes'
+TRACE_STEP_SCHEDULE = 'schedule'
+
+PROFILER_DEFAULT_CYCLES = 5
+PROFILER_MAX_CYCLES = 100
+PROFILER_MAX_DURATION = timedelta(hours=2)
+PROFILER_HOT_SPOTS = 10
+PROFILER_SORT_KEY = 'cumulative'
+
+SOURCE_INTERVAL = 'interval'
+SOURCE_SERVICE = 'service'
+SOURCE_START = 'start'
+SOURCE_TRACKER = 'tracker'
+SOURCE_BOUNDARY = 'boundary'
+SOURCE_RULE = 'rule'
+
+SCRIPT_OUTCOME_SKIPPED = 'skipped'
+SCRIPT_OUTCOME_NO_SCRIPT = 'no_script'
+SCRIPT_OUTCOME_STARTED = 'started'
+SCRIPT_OUTCOME_FAILED = 'failed'
+
+SERVICE_UPDATE = 'update'
+SERVICE_RUN_CURRENT_SCENE = 'run_current_scene'
+SERVICE_GET_HISTORY = 'get_history'
+SERVICE_GET_PROFILE = 'get_profile'
+SERVICE_ADD_EVENT = 'add_event'
+SERVICE_REMOVE_EVENT = 'remove_event'
+SERVICE_SET_PART = 'set_part'
+SERVICE_PROFILE = 'profile'
+SERVICE_GET_ARCHIVE = 'get_archive'
+
+STORAGE_VERSION = 1
+STORAGE_KEY = f'{DOMAIN}.configuration'
+STORAGE_SAVE_DELAY = 10
+STORAGE_EVENTS = 'events'
+STORAGE_REMOVED_EVENTS = 'removed_events'
+STORAGE_PARTS = 'parts'
+
+EVENT_HAM_HISTORY = 'ham_history'
+EVENT_HAM_PROFILE = 'ham_profile'
+EVENT_HAM_ARCHIVE = 'ham_archive'
+
+ARCHIVE_FILE_NAME = 'ham_archive.jsonl'
 
-TRACKERS_AWAY_STATES = [STATE_NOT_HOME, STATE_OFF]
 ALLOWED_TRACKERS = [DEVICE_TRACKER_DOMAIN]
+TRACKERS_IGNORED_STATES = [None, STATE_UNKNOWN, STATE_UNAVAILABLE]
+ALLOWED_RULE_DOMAINS = [INPUT_BOOLEAN_DOMAIN, SWITCH_DOMAIN]
 SYSTEM_PROFILES = [DEFAULT_PROFILE, AWAY_PROFILE]
-DAY_PART_TYPES = [DAY_PART_MORNING, DAY_PART_NOON, DAY_PART_AFTERNOON, DAY_PART_EVENING, DAY_PART_NIGHT]
+OCCUPANCY_LEVELS = [OCCUPANCY_EMPTY, OCCUPANCY_SINGLE, OCCUPANCY_PARTIAL, OCCUPANCY_FULL]
+SCENE_OCCUPANCY_LEVELS = [OCCUPANCY_SINGLE, OCCUPANCY_PARTIAL, OCCUPANCY_FULL]
+RRULE_FREQUENCIES = [RRULE_DAILY, RRULE_WEEKLY, RRULE_MONTHLY, RRULE_YEARLY]
+RRULE_WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
 DAY_NAMES = [DAY_SUNDAY, DAY_MONDAY, DAY_TUESDAY, DAY_WEDNESDAY, DAY_THURSDAY, DAY_FRIDAY, DAY_SATURDAY]
-SCENES_TYPES = [DAY_PART_MORNING, DAY_PART_NOON, DAY_PART_AFTERNOON, DAY_PART_EVENING, DAY_PART_NIGHT, AWAY_PROFILE]
+
+PART_FROM_FORMAT = '%H:%M:%S'
 
 BINARY_SENSOR_DEFAULT_ICON = 'pig'
 BINARY_SENSOR_DEFAULT_DEVICE_CLASS = 'None'
@@ -81,25 +185,84 @@ SENSOR_DEFAULT_DEVICE_CLASS = 'None'
 ATTR_DAY_PART = 'day_part'
 ATTR_CURRENT_PROFILE = 'current_profile'
 ATTR_CURRENT_SCENE = 'current_scene'
+ATTR_OCCUPANCY = 'occupancy'
+ATTR_OCCUPANCY_LEVEL = 'level'
+ATTR_PRESENT_TRACKERS = 'present_trackers'
+ATTR_SCHEDULING = 'scheduling'
+ATTR_MAX_LAG = 'max_lag'
+ATTR_UPDATES = 'updates'
+ATTR_LATE_UPDATES = 'late_updates'
+ATTR_MISSED_TRANSITIONS = 'missed_transitions'
+ATTR_REPLAYED_TRANSITIONS = 'replayed_transitions'
+ATTR_LAST_TRANSITION_LATENCY = 'last_transition_latency'
+ATTR_MAX_TRANSITION_LATENCY = 'max_transition_latency'
+ATTR_AVERAGE_TRANSITION_LATENCY = 'average_transition_latency'
+ATTR_TRANSITIONS_MEASURED = 'transitions_measured'
+ATTR_TRANSITIONS_OVER_BOUND = 'transitions_over_bound'
+ATTR_NEXT_TRANSITION = 'next_transition'
 ATTR_STATE = 'state'
 ATTR_ATTRIBUTES = 'attributes'
 
+ATTR_TIMESTAMP = 'timestamp'
+ATTR_SOURCE = 'source'
+ATTR_OLD_PROFILE = 'old_profile'
+ATTR_NEW_PROFILE = 'new_profile'
+ATTR_OLD_PART = 'old_part'
+ATTR_NEW_PART = 'new_part'
+ATTR_OLD_SCENE = 'old_scene'
+ATTR_NEW_SCENE = 'new_scene'
+ATTR_IS_AWAY = 'is_away'
+ATTR_OUTCOME = 'outcome'
+ATTR_SCENE = 'scene'
+ATTR_SINCE = 'since'
+ATTR_LIMIT = 'limit'
+ATTR_TRANSITIONS = 'transitions'
+ATTR_CYCLES = 'cycles'
+ATTR_LAST_DATE = 'last_date'
+ATTR_ARCHIVED = 'archived'
+ATTR_UNTIL = 'until'
+ATTR_ARCHIVED_EVENTS = 'events'
+ATTR_TRACE_REFRESH = 'refresh'
+ATTR_TRACE_STEPS = 'steps'
+ATTR_TRACE_DURATION = 'duration'
+ATTR_TRACE_EVENTS = 'events'
+ATTR_CALENDAR_SUMMARY = 'summary'
+ATTR_CALENDAR_DESCRIPTION = 'description'
+ATTR_CALENDAR_START = 'start'
+ATTR_CALENDAR_END = 'end'
+ATTR_CALENDAR_DATE = 'date'
+ATTR_INCLUDE_SCENES = 'include_scenes'
+
 SENSOR_TYPES = {
     ATTR_WEEKDAY: ['Weekday', None, 'calendar-week-begin'],
     ATTR_DAY_PART: ['Current Day Part', None, 'weather-night'],
     ATTR_CURRENT_PROFILE: ['Current Profile', None, 'bullseye-arrow'],
-    ATTR_CURRENT_SCENE: ['Current Scene', None, 'movie']
+    ATTR_CURRENT_SCENE: ['Current Scene', None, 'movie'],
+    ATTR_OCCUPANCY: ['Occupancy', None, 'account-group'],
+    ATTR_SCHEDULING: ['Scheduling Lag', 's', 'timer-sand']
 }
 
 SCENE_SCHEMA = vol.Schema({
-    vol.Required(CONF_SCENE_NAME):
-        vol.In(SCENES_TYPES),
+    vol.Required(CONF_SCENE_NAME): cv.string,
+    vol.Optional(CONF_PROFILE_NAME): cv.string,
+    vol.Optional(CONF_SCENE_OCCUPANCY):
+        vol.In(SCENE_OCCUPANCY_LEVELS),
     vol.Optional(CONF_SCENE_SCRIPT): cv.SCRIPT_SCHEMA
 })
 
+RULE_CONDITION_SCHEMA = vol.Schema({
+    vol.Required(CONF_ENTITY_ID): cv.entity_id,
+    vol.Optional(CONF_RULE_STATE, default=STATE_ON): cv.string
+})
+
+RULE_SCHEMA = vol.Schema({
+    vol.Required(CONF_PROFILE_NAME): cv.string,
+    vol.Required(CONF_RULE_CONDITIONS):
+        vol.All(cv.ensure_list, [vol.Any(RULE_CONDITION_SCHEMA)])
+})
+
 PART_SCHEMA = vol.Schema({
-    vol.Required(CONF_NAME):
-        vol.In(DAY_PART_TYPES),
+    vol.Required(CONF_NAME): cv.string,
     vol.Required(CONF_PROFILE_FROM): cv.string,
 })
 
@@ -132,15 +295,68 @@ PROFILE_DAY_OVERRIDE_SCHEMA = PROFILE_OVERRIDE_SCHEMA.extend({
         vol.In(DAY_NAMES),
 })
 
+PROFILE_RANGE_OVERRIDE_SCHEMA = PROFILE_OVERRIDE_SCHEMA.extend({
+    vol.Required(CONF_EVENT_START): cv.string,
+    vol.Optional(CONF_EVENT_END): cv.string,
+    vol.Optional(CONF_EVENT_RRULE): cv.string,
+})
+
+SERVICE_GET_HISTORY_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_SOURCE):
+        vol.In([SOURCE_INTERVAL, SOURCE_SERVICE, SOURCE_START, SOURCE_TRACKER, SOURCE_BOUNDARY, SOURCE_RULE]),
+    vol.Optional(CONF_PROFILE_NAME): cv.string,
+    vol.Optional(ATTR_SCENE): cv.string,
+    vol.Optional(ATTR_SINCE): cv.datetime,
+    vol.Optional(ATTR_LIMIT): cv.positive_int,
+})
+
+SERVICE_GET_PROFILE_SCHEMA = vol.Schema({
+    vol.Optional(CONF_PROFILE_NAME): cv.string,
+})
+
+SERVICE_ADD_EVENT_SCHEMA = vol.Any(PROFILE_DATE_OVERRIDE_SCHEMA, PROFILE_DAY_OVERRIDE_SCHEMA,
+                                   PROFILE_RANGE_OVERRIDE_SCHEMA)
+
+SERVICE_REMOVE_EVENT_SCHEMA = vol.Any(PROFILE_OVERRIDE_SCHEMA, PROFILE_DATE_OVERRIDE_SCHEMA,
+                                      PROFILE_DAY_OVERRIDE_SCHEMA, PROFILE_RANGE_OVERRIDE_SCHEMA)
+
+SERVICE_SET_PART_SCHEMA = vol.Schema({
+    vol.Required(CONF_PROFILE_NAME): cv.string,
+    vol.Required(CONF_NAME): cv.string,
+    vol.Optional(CONF_PROFILE_FROM): cv.string,
+})
+
+SERVICE_GET_ARCHIVE_SCHEMA = vol.Schema({
+    vol.Optional(CONF_PROFILE_NAME): cv.string,
+    vol.Optional(CONF_EVENT_TITLE): cv.string,
+    vol.Optional(ATTR_SINCE): cv.date,
+    vol.Optional(ATTR_UNTIL): cv.date,
+    vol.Optional(ATTR_LIMIT): cv.positive_int,
+})
+
+SERVICE_PROFILE_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_CYCLES, default=PROFILER_DEFAULT_CYCLES):
+        vol.All(vol.Coerce(int), vol.Range(min=1, max=PROFILER_MAX_CYCLES)),
+    vol.Optional(ATTR_INCLUDE_SCENES, default=False): cv.boolean,
+})
+
 CONFIG_SCHEMA = vol.Schema({
     DOMAIN: vol.Schema({
         vol.Required(CONF_PROFILE_DEFAULT): PROFILE_DEFAULT_SCHEMA,
         vol.Optional(CONF_PROFILES):
             vol.All(cv.ensure_list, [vol.Any(PROFILE_SCHEMA)]),
         vol.Optional(CONF_EVENTS):
-            vol.All(cv.ensure_list, [vol.Any(PROFILE_DATE_OVERRIDE_SCHEMA, PROFILE_DAY_OVERRIDE_SCHEMA)]),
+            vol.All(cv.ensure_list, [vol.Any(PROFILE_DATE_OVERRIDE_SCHEMA, PROFILE_DAY_OVERRIDE_SCHEMA,
+                                             PROFILE_RANGE_OVERRIDE_SCHEMA)]),
         vol.Optional(CONF_TRACKERS): cv.entity_ids,
         vol.Optional(CONF_SCENES):
             vol.All(cv.ensure_list, [vol.Any(SCENE_SCHEMA)]),
+        vol.Optional(CONF_RULES):
+            vol.All(cv.ensure_list, [vol.Any(RULE_SCHEMA)]),
+        vol.Optional(CONF_HISTORY_SIZE, default=DEFAULT_HISTORY_SIZE): cv.positive_int,
+        vol.Optional(CONF_COMPACT_ATTRIBUTES, default=False): cv.boolean,
+        vol.Optional(CONF_CATCH_UP, default=CATCH_UP_LATEST):
+            vol.In([CATCH_UP_LATEST, CATCH_UP_REPLAY]),
+        vol.Optional(CONF_TRACE_INTERVAL, default=0): cv.positive_int,
     }),
 }, extra=vol.ALLOW_EXTRA)
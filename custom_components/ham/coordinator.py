@@ -0,0 +1,49 @@
+"""Publishing of the states of all HAM entities together."""
+import logging
+
+from homeassistant.core import callback
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerCoordinator:
+    """Publish the states of all HAM entities together, in a single event loop iteration."""
+
+    def __init__(self, hass, get_snapshot):
+        self._hass = hass
+        self._get_snapshot = get_snapshot
+        self._entities = []
+        self._is_publish_pending = False
+
+    def register(self, entity):
+        self._entities.append(entity)
+
+    def unregister(self, entity):
+        if entity in self._entities:
+            self._entities.remove(entity)
+
+    def publish(self):
+        """Schedule publishing from any thread, pending publish is not scheduled again."""
+        if self._is_publish_pending:
+            return
+
+        self._is_publish_pending = True
+
+        self._hass.add_job(self.async_publish)
+
+    @callback
+    def async_publish(self):
+        """
+        Refresh and write changed states of all entities without yielding to the event loop,
+        all entities are refreshed from the same snapshot, captured once per publish.
+        """
+        self._is_publish_pending = False
+
+        snapshot = self._get_snapshot()
+
+        changed_entities = [entity for entity in self._entities if entity.refresh(snapshot)]
+
+        for entity in changed_entities:
+            entity.async_write_ha_state()
+
+        _LOGGER.debug('Published %s of %s entities', len(changed_entities), len(self._entities))
@@ -0,0 +1,448 @@
+"""Index of the events (date, range, weekday and recurring) by date."""
+import calendar
+import logging
+from bisect import bisect_left, insort
+from datetime import date, datetime
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_event_date(value):
+    return datetime.strptime(value, EVENT_DATE_FORMAT).date()
+
+
+class HomeAutomationManagerRecurrence:
+    """
+    Subset of RFC 5545 RRULE, supported parts: FREQ (DAILY, WEEKLY, MONTHLY, YEARLY),
+    INTERVAL, BYDAY (with ordinal for MONTHLY / YEARLY, within the month), BYMONTHDAY, BYMONTH and UNTIL.
+    """
+
+    def __init__(self, rule, start):
+        self._rule = rule
+        self._start = start
+        self._frequency = None
+        self._interval = 1
+        self._by_day = []
+        self._by_month_day = []
+        self._by_month = []
+        self._until = None
+
+        self.parse()
+
+    def parse(self):
+        for rule_part in self._rule.upper().split(';'):
+            if rule_part == '':
+                continue
+
+            key, value = rule_part.split('=', 1)
+
+            if key == RRULE_FREQ:
+                if value not in RRULE_FREQUENCIES:
+                    raise ValueError(f'Unsupported frequency {value}')
+
+                self._frequency = value
+
+            elif key == RRULE_INTERVAL:
+                self._interval = int(value)
+
+                if self._interval < 1:
+                    raise ValueError(f'Invalid interval {value}')
+
+            elif key == RRULE_BY_DAY:
+                for day in value.split(','):
+                    ordinal = day[:-2]
+                    weekday = RRULE_WEEKDAYS.index(day[-2:])
+
+                    self._by_day.append((int(ordinal) if ordinal != '' else None, weekday))
+
+            elif key == RRULE_BY_MONTH_DAY:
+                self._by_month_day = [int(month_day) for month_day in value.split(',')]
+
+            elif key == RRULE_BY_MONTH:
+                self._by_month = [int(month) for month in value.split(',')]
+
+            elif key == RRULE_UNTIL:
+                self._until = datetime.strptime(value[:8], '%Y%m%d').date()
+
+            else:
+                raise ValueError(f'Unsupported rule part {key}')
+
+        if self._frequency is None:
+            raise ValueError(f'{RRULE_FREQ} is required')
+
+    def get_until(self):
+        return self._until
+
+    def occurs_on(self, current_date):
+        start = self._start
+
+        if current_date < start:
+            return False
+
+        if self._until is not None and current_date > self._until:
+            return False
+
+        if len(self._by_month) > 0 and current_date.month not in self._by_month:
+            return False
+
+        if self._frequency == RRULE_DAILY:
+            periods = (current_date - start).days
+
+        elif self._frequency == RRULE_WEEKLY:
+            periods = (current_date.toordinal() - current_date.weekday() -
+                       start.toordinal() + start.weekday()) // 7
+
+        elif self._frequency == RRULE_MONTHLY:
+            periods = (current_date.year - start.year) * 12 + current_date.month - start.month
+
+        else:
+            periods = current_date.year - start.year
+
+        if periods % self._interval != 0:
+            return False
+
+        is_matched = True
+
+        if len(self._by_day) > 0:
+            is_matched = self.is_by_day_matched(current_date)
+
+        elif self._frequency == RRULE_WEEKLY:
+            is_matched = current_date.weekday() == start.weekday()
+
+        if len(self._by_month_day) > 0:
+            is_matched = is_matched and self.is_by_month_day_matched(current_date)
+
+        elif len(self._by_day) == 0 and self._frequency in [RRULE_MONTHLY, RRULE_YEARLY]:
+            is_matched = current_date.day == start.day
+
+        if is_matched and self._frequency == RRULE_YEARLY and len(self._by_month) == 0:
+            is_matched = current_date.month == start.month
+
+        return is_matched
+
+    def is_by_day_matched(self, current_date):
+        days_in_month = calendar.monthrange(current_date.year, current_date.month)[1]
+
+        for ordinal, weekday in self._by_day:
+            if current_date.weekday() != weekday:
+                continue
+
+            if ordinal is None:
+                return True
+
+            if ordinal > 0 and (current_date.day - 1) // 7 + 1 == ordinal:
+                return True
+
+            if ordinal < 0 and (days_in_month - current_date.day) // 7 + 1 == -ordinal:
+                return True
+
+        return False
+
+    def is_by_month_day_matched(self, current_date):
+        days_in_month = calendar.monthrange(current_date.year, current_date.month)[1]
+
+        for month_day in self._by_month_day:
+            if month_day < 0:
+                month_day = days_in_month + month_day + 1
+
+            if current_date.day == month_day:
+                return True
+
+        return False
+
+
+class HomeAutomationManagerIntervalNode:
+    __slots__ = ['center', 'by_start', 'by_end', 'left', 'right']
+
+    def __init__(self, center):
+        self.center = center
+        self.by_start = []
+        self.by_end = []
+        self.left = None
+        self.right = None
+
+
+class HomeAutomationManagerIntervalTree:
+    """Centered interval tree of inclusive intervals, stabbing query takes O(log n + k)."""
+
+    def __init__(self):
+        self._root = None
+
+    def build(self, entries):
+        """Build a balanced tree from entries of (start, end, interval id)."""
+        self._root = self.build_node(entries)
+
+    def build_node(self, entries):
+        if len(entries) == 0:
+            return None
+
+        endpoints = sorted([entry[0] for entry in entries] + [entry[1] for entry in entries])
+        node = HomeAutomationManagerIntervalNode(endpoints[len(endpoints) // 2])
+
+        left = []
+        right = []
+
+        for entry in entries:
+            if entry[1] < node.center:
+                left.append(entry)
+            elif entry[0] > node.center:
+                right.append(entry)
+            else:
+                self.add_to_node(node, entry)
+
+        node.left = self.build_node(left)
+        node.right = self.build_node(right)
+
+        return node
+
+    @staticmethod
+    def add_to_node(node, entry):
+        start, end, interval_id = entry
+
+        insort(node.by_start, (start, end, interval_id))
+        insort(node.by_end, (end, start, interval_id))
+
+    def insert(self, entry):
+        start, end, interval_id = entry
+
+        if self._root is None:
+            self._root = HomeAutomationManagerIntervalNode((start + end) // 2)
+
+        node = self._root
+
+        while True:
+            if end < node.center:
+                if node.left is None:
+                    node.left = HomeAutomationManagerIntervalNode((start + end) // 2)
+
+                node = node.left
+
+            elif start > node.center:
+                if node.right is None:
+                    node.right = HomeAutomationManagerIntervalNode((start + end) // 2)
+
+                node = node.right
+
+            else:
+                self.add_to_node(node, entry)
+                break
+
+    def remove(self, entry):
+        start, end, interval_id = entry
+        node = self._root
+
+        while node is not None:
+            if end < node.center:
+                node = node.left
+
+            elif start > node.center:
+                node = node.right
+
+            else:
+                by_start_entry = (start, end, interval_id)
+                by_end_entry = (end, start, interval_id)
+
+                index = bisect_left(node.by_start, by_start_entry)
+                if index < len(node.by_start) and node.by_start[index] == by_start_entry:
+                    del node.by_start[index]
+
+                index = bisect_left(node.by_end, by_end_entry)
+                if index < len(node.by_end) and node.by_end[index] == by_end_entry:
+                    del node.by_end[index]
+
+                break
+
+    def query(self, point):
+        """Return ids of the intervals containing point."""
+        result = []
+        node = self._root
+
+        while node is not None:
+            if point < node.center:
+                for start, end, interval_id in node.by_start:
+                    if start > point:
+                        break
+
+                    result.append(interval_id)
+
+                node = node.left
+
+            elif point > node.center:
+                for end, start, interval_id in reversed(node.by_end):
+                    if end < point:
+                        break
+
+                    result.append(interval_id)
+
+                node = node.right
+
+            else:
+                result.extend([entry[2] for entry in node.by_start])
+                break
+
+        return result
+
+
+class HomeAutomationManagerEventIndex:
+    """
+    Events of dates / weekdays by key, date ranges and recurrences in an interval tree,
+    events with a last date are kept sorted by it to find the past events with a binary search.
+    """
+
+    def __init__(self):
+        self._events_by_id = {}
+        self._events_by_key = {}
+        self._intervals = {}
+        self._interval_tree = HomeAutomationManagerIntervalTree()
+        self._last_interval_id = 0
+        self._last_dates = []
+
+    def build(self, events):
+        """Load all events at once, the interval tree is built balanced."""
+        entries = []
+
+        for event in events:
+            entry = self.add_event(event, False)
+
+            if entry is not None:
+                entries.append(entry)
+
+        self._interval_tree.build(entries)
+
+    @staticmethod
+    def get_last_date(event):
+        """Return the last date the event can occur on, None for events of weekday or endless recurrence."""
+        last_date = None
+
+        if CONF_EVENT_START in event:
+            last_date = event[ATTR_EVENT_END_DATE]
+            recurrence = event[ATTR_EVENT_RECURRENCE]
+
+            if last_date is None:
+                if recurrence is None:
+                    last_date = event[ATTR_EVENT_START_DATE]
+
+                elif recurrence.get_until() is not None:
+                    last_date = recurrence.get_until()
+
+        elif event[ATTR_EVENT_KEY] not in DAY_NAMES:
+            last_date = parse_event_date(event[ATTR_EVENT_KEY])
+
+        return last_date
+
+    def add_event(self, event, insert_interval=True):
+        entry = None
+        last_date = self.get_last_date(event)
+
+        if last_date is not None:
+            insort(self._last_dates, (last_date.toordinal(), event[ATTR_EVENT_ID]))
+
+        if CONF_EVENT_START in event:
+            start = event[ATTR_EVENT_START_DATE]
+            end = date.max if last_date is None else last_date
+
+            self._last_interval_id += 1
+
+            entry = (start.toordinal(), end.toordinal(), self._last_interval_id)
+            self._intervals[self._last_interval_id] = (entry, event)
+
+            if insert_interval:
+                self._interval_tree.insert(entry)
+
+        else:
+            event_key = event[ATTR_EVENT_KEY]
+
+            if event_key in self._events_by_key:
+                self._events_by_key[event_key].append(event)
+            else:
+                self._events_by_key[event_key] = [event]
+
+        self._events_by_id[event[ATTR_EVENT_ID]] = (entry, event)
+
+        return entry
+
+    def remove_event(self, event_id):
+        """Remove event by its id, returns whether the event was found."""
+        if event_id not in self._events_by_id:
+            return False
+
+        entry, event = self._events_by_id.pop(event_id)
+        last_date = self.get_last_date(event)
+
+        if last_date is not None:
+            last_date_entry = (last_date.toordinal(), event_id)
+            index = bisect_left(self._last_dates, last_date_entry)
+
+            if index < len(self._last_dates) and self._last_dates[index] == last_date_entry:
+                del self._last_dates[index]
+
+        if entry is not None:
+            self._interval_tree.remove(entry)
+
+            del self._intervals[entry[2]]
+
+        else:
+            events = self._events_by_key[event[ATTR_EVENT_KEY]]
+            events.remove(event)
+
+            if len(events) == 0:
+                del self._events_by_key[event[ATTR_EVENT_KEY]]
+
+        return True
+
+    def get_event(self, event_id):
+        event = None
+
+        if event_id in self._events_by_id:
+            event = self._events_by_id[event_id][1]
+
+        return event
+
+    def get_past_events(self, current_date):
+        """Return the events which their last date is before current_date."""
+        index = bisect_left(self._last_dates, (current_date.toordinal(),))
+
+        return [self._events_by_id[event_id][1] for _, event_id in self._last_dates[:index]]
+
+    def get_range_events(self, start_date, end_date):
+        """Return the date range (not recurring) events overlapping start_date until end_date (inclusive)."""
+        events = []
+
+        for (start, end, _), event in self._intervals.values():
+            if event[ATTR_EVENT_RECURRENCE] is None and start <= end_date.toordinal() and end >= start_date.toordinal():
+                events.append(event)
+
+        return events
+
+    def occurs_on(self, event, current_date):
+        """Whether the event occurs on current_date, same as get_events for a single event."""
+        if CONF_EVENT_START not in event:
+            return event[ATTR_EVENT_KEY] in [current_date.strftime(EVENT_DATE_FORMAT), current_date.strftime('%A')]
+
+        last_date = self.get_last_date(event)
+        recurrence = event[ATTR_EVENT_RECURRENCE]
+
+        if current_date < event[ATTR_EVENT_START_DATE] or (last_date is not None and current_date > last_date):
+            return False
+
+        return recurrence is None or recurrence.occurs_on(current_date)
+
+    def get_events(self, current_date):
+        events = []
+
+        for event_key in [current_date.strftime(EVENT_DATE_FORMAT), current_date.strftime('%A')]:
+            events.extend(self._events_by_key.get(event_key, []))
+
+        for interval_id in sorted(self._interval_tree.query(current_date.toordinal())):
+            entry, event = self._intervals[interval_id]
+            recurrence = event[ATTR_EVENT_RECURRENCE]
+
+            if recurrence is None or recurrence.occurs_on(current_date):
+                events.append(event)
+
+        return events
+
+    def __len__(self):
+        return len(self._events_by_id)
@@ -1,15 +1,29 @@
 import logging
-from datetime import datetime
+import threading
 
-from homeassistant.const import (CONF_ENTITY_ID, EVENT_STATE_CHANGED,
+from homeassistant.const import (CONF_ENTITY_ID, EVENT_STATE_CHANGED, EVENT_CALL_SERVICE,
                                  EVENT_HOMEASSISTANT_START)
-from homeassistant.helpers.event import track_time_interval
-from homeassistant.helpers.dispatcher import dispatcher_send
+from homeassistant.core import Context
+from homeassistant.helpers.event import track_time_interval, track_point_in_time
 from homeassistant.helpers.script import Script
+import homeassistant.util.dt as dt_util
 
 from homeassistant.components.group import DOMAIN as GROUP_DOMAIN
 
+from .archive import HomeAutomationManagerArchive
 from .const import *
+from .configuration_transformer import HomeAutomationManagerConfigurationTransformer
+from .coordinator import HomeAutomationManagerCoordinator
+from .history import HomeAutomationManagerHistory
+from .occupancy import HomeAutomationManagerOccupancy
+from .occurrence_window import HomeAutomationManagerOccurrenceWindow
+from .profiler import HomeAutomationManagerProfiler
+from .rules import HomeAutomationManagerRules
+from .scheduling import HomeAutomationManagerSchedulingMonitor
+from .snapshot import HomeAutomationManagerSnapshot
+from .timeline import parse_part_from
+from .tracer import HomeAutomationManagerTracer
+from .transition import HomeAutomationManagerTransitionScheduler
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -17,18 +31,21 @@ _LOGGER = logging.getLogger(__name__)
 class HomeAutomationManagerData:
     """The Class for handling the data retrieval."""
 
-    def __init__(self, hass, scan_interval, configuration):
+    def __init__(self, hass, scan_interval, configuration, options, storage):
         """Initialize the data object."""
-        _LOGGER.debug(f'HomeAutomationManagerData initialization with following configuration: {configuration}')
+        _LOGGER.debug('HomeAutomationManagerData initialization with following configuration: %s', configuration)
 
         self._profiles = configuration[CONF_PROFILES]
         self._events = configuration[CONF_EVENTS]
         self._trackers = configuration[CONF_TRACKERS]
         self._scenes = configuration[CONF_SCENES]
+        self._scene_matrix = configuration[ATTR_SCENE_MATRIX]
+        self._rules = configuration[CONF_RULES]
         self._custom_profiles = configuration[ATTR_CUSTOM_PROFILES]
         self._configuration_errors = configuration[ATTR_CONFIG_ERRORS]
 
         self._hass = hass
+        self._storage = storage
         self._was_initialized = False
 
         if self._configuration_errors is not None:
@@ -44,48 +61,134 @@ class HomeAutomationManagerData:
                 is_valid = False
 
         if is_valid:
-            self._current_scene = None
-            self._events_of_today = None
+            self._snapshot = HomeAutomationManagerSnapshot()
+            self._update_lock = threading.Lock()
+            self._scene_lock = threading.Lock()
+            self._scene_request_lock = threading.Lock()
+            self._scene_snapshot = self._snapshot
+            self._is_scene_requested = False
+            self._is_scene_rerun = False
             self._latest_details = None
-            self._current_date_time = None
-            self._current_weekday = None
-            self._current_part = None
-            self._current_profile = None
             self._profile_data = None
-            self._is_away = None
             self._group_trackers_id = None
+            self._occupancy = HomeAutomationManagerOccupancy(self._trackers)
+            self._profile_rules = HomeAutomationManagerRules(self._rules)
+            self._occurrence_window = HomeAutomationManagerOccurrenceWindow(self._events, CALENDAR_WINDOW_DAYS)
+            self._archive = HomeAutomationManagerArchive(hass.config.path(ARCHIVE_FILE_NAME))
+            self._history = HomeAutomationManagerHistory(options[CONF_HISTORY_SIZE])
+            self._compact_attributes = options[CONF_COMPACT_ATTRIBUTES]
+            self._coordinator = HomeAutomationManagerCoordinator(hass, self.get_snapshot)
+            self._catch_up = options[CONF_CATCH_UP]
+            self._scheduling_monitor = HomeAutomationManagerSchedulingMonitor(scan_interval)
+            self._profiler = HomeAutomationManagerProfiler(hass, self.create_profiler_notification)
+            self._tracer = HomeAutomationManagerTracer(options[CONF_TRACE_INTERVAL])
 
             self.create_tracker_group()
+            self.initialize_occupancy()
+            self.initialize_profile_rules()
             self.initialize_profile_data()
 
-            def ham_refresh(event_time):
+            def ham_refresh(event_time, source=SOURCE_INTERVAL, boundary=None):
                 """Call Home Automation Manager (HAM) to refresh information."""
-                _LOGGER.debug(f'Updating Home Automation Manager (HAM) component, at {event_time}')
-                self.update()
-                dispatcher_send(hass, SIGNAL_UPDATE_HAM)
+                _LOGGER.debug('Updating Home Automation Manager (HAM) component by %s, at %s', source, event_time)
+                self._profiler.run(self.update, source, boundary)
+                self._coordinator.publish()
+
+            def ham_update(service):
+                """Call Home Automation Manager (HAM) to refresh information by service."""
+                self._ham_refresh(dt_util.now(), SOURCE_SERVICE)
 
             def ham_run_current_scene(event_time):
                 """Call Home Automation Manager (HAM) to run current scene."""
-                _LOGGER.debug(f'Calling current scene script, at {event_time}')
+                _LOGGER.debug('Calling current scene script, at %s', event_time)
                 self.invoke_current_scene()
 
+            def ham_get_history(service):
+                """Fire an event with the transitions matching the filters of the service call."""
+                self.fire_history_event(service.data)
+
+            def ham_get_profile(service):
+                """Fire an event with the parts and events of the profile (current profile by default)."""
+                profile = service.data.get(CONF_PROFILE_NAME, self.get_current_profile())
+
+                self.fire_profile_event(profile)
+
+            def ham_get_archive(service):
+                """Fire an event with the archived (past) events matching the filters of the service call."""
+                self.fire_archive_event(service.data)
+
+            def ham_add_event(service):
+                """Add event, stored and applied without restart."""
+                self.call_runtime_change(self.add_event, dict(service.data))
+
+            def ham_remove_event(service):
+                """Remove event, stored and applied without restart."""
+                self.call_runtime_change(self.remove_event, dict(service.data))
+
+            def ham_set_part(service):
+                """Set or remove (without from) part of profile, stored and applied without restart."""
+                data = service.data
+
+                self.call_runtime_change(self.set_part, data[CONF_PROFILE_NAME], data[CONF_NAME],
+                                         data.get(CONF_PROFILE_FROM))
+
+            def ham_profile(service):
+                """Profile the next refresh cycles, stats are written to the configuration directory."""
+                data = service.data
+
+                self._profiler.start(data[ATTR_CYCLES], data[ATTR_INCLUDE_SCENES])
+
+            def ham_refresh_at_boundary(boundary):
+                """Call Home Automation Manager (HAM) to refresh information at part boundary."""
+                self._ham_refresh(boundary, SOURCE_BOUNDARY, boundary)
+
             self._ham_run_current_scene = ham_run_current_scene
             self._ham_refresh = ham_refresh
+            self._transition_scheduler = HomeAutomationManagerTransitionScheduler(hass, self.prepare_scene,
+                                                                                  ham_refresh_at_boundary)
+
+            def ham_start(event_time):
+                """Reload trackers and rules states once all components are loaded and refresh."""
+                self.initialize_occupancy()
+                self.initialize_profile_rules()
+                self._ham_refresh(event_time, SOURCE_START)
 
             def check_event(event):
-                if event.data[CONF_ENTITY_ID] == self._group_trackers_id:
-                    time_fired = event.time_fired
+                entity_id = event.data[CONF_ENTITY_ID]
+
+                if self._occupancy.is_tracker(entity_id):
+                    new_state = event.data.get('new_state')
+                    state = None if new_state is None else new_state.state
+
+                    if self._occupancy.set_tracker_state(entity_id, state):
+                        time_fired = event.time_fired
+
+                        self._ham_refresh(time_fired, SOURCE_TRACKER)
+
+                if self._profile_rules.is_dependency(entity_id):
+                    new_state = event.data.get('new_state')
+                    state = None if new_state is None else new_state.state
+
+                    if self._profile_rules.set_state(entity_id, state):
+                        time_fired = event.time_fired
 
-                    self._ham_refresh(time_fired)
+                        self._ham_refresh(time_fired, SOURCE_RULE)
 
             # register service
-            hass.services.register(DOMAIN, 'update', ham_refresh)
-            hass.services.register(DOMAIN, 'run_current_scene', ham_run_current_scene)
+            hass.services.register(DOMAIN, SERVICE_UPDATE, ham_update)
+            hass.services.register(DOMAIN, SERVICE_RUN_CURRENT_SCENE, ham_run_current_scene)
+            hass.services.register(DOMAIN, SERVICE_GET_HISTORY, ham_get_history, schema=SERVICE_GET_HISTORY_SCHEMA)
+            hass.services.register(DOMAIN, SERVICE_GET_PROFILE, ham_get_profile, schema=SERVICE_GET_PROFILE_SCHEMA)
+            hass.services.register(DOMAIN, SERVICE_GET_ARCHIVE, ham_get_archive, schema=SERVICE_GET_ARCHIVE_SCHEMA)
+            hass.services.register(DOMAIN, SERVICE_ADD_EVENT, ham_add_event, schema=SERVICE_ADD_EVENT_SCHEMA)
+            hass.services.register(DOMAIN, SERVICE_REMOVE_EVENT, ham_remove_event, schema=SERVICE_REMOVE_EVENT_SCHEMA)
+            hass.services.register(DOMAIN, SERVICE_SET_PART, ham_set_part, schema=SERVICE_SET_PART_SCHEMA)
+            hass.services.register(DOMAIN, SERVICE_PROFILE, ham_profile, schema=SERVICE_PROFILE_SCHEMA)
 
             # register scan interval for Home Automation Manager (HAM)
             track_time_interval(hass, ham_refresh, scan_interval)
 
-            hass.bus.listen_once(EVENT_HOMEASSISTANT_START, ham_refresh)
+            hass.bus.listen_once(EVENT_HOMEASSISTANT_START, ham_start)
 
             hass.bus.listen(EVENT_STATE_CHANGED, check_event)
 
@@ -94,11 +197,28 @@ class HomeAutomationManagerData:
     def was_initialized(self):
         return self._was_initialized
 
-    def create_persistent_notification(self, message):
+    def get_coordinator(self):
+        return self._coordinator
+
+    def call_runtime_change(self, change, *args):
+        """Apply change of events / parts and refresh, errors are reported as persistent notification."""
+        try:
+            change(*args)
+
+            self._ham_refresh(dt_util.now(), SOURCE_SERVICE)
+        except Exception as ex:
+            _LOGGER.error('Failed to apply %s, error: %s', change.__name__, ex)
+
+            self.create_persistent_notification(f'Failed to apply {change.__name__}, error: {str(ex)}')
+
+    def create_persistent_notification(self, message, title=NOTIFICATION_TITLE, notification_id=NOTIFICATION_ID):
         self._hass.components.persistent_notification.create(
             message,
-            title=NOTIFICATION_TITLE,
-            notification_id=NOTIFICATION_ID)
+            title=title,
+            notification_id=notification_id)
+
+    def create_profiler_notification(self, message):
+        self.create_persistent_notification(message, PROFILER_NOTIFICATION_TITLE, PROFILER_NOTIFICATION_ID)
 
     def validate_scenes(self):
         if self._scenes is not None:
@@ -106,14 +226,14 @@ class HomeAutomationManagerData:
                 scene = self._scenes[scene_key]
                 scene_name = scene[CONF_SCENE_NAME]
 
-                _LOGGER.debug(f'Validate Scene {scene_name}')
+                _LOGGER.debug('Validate Scene %s', scene_name)
 
         return True
 
     def validate_trackers(self):
         if self._trackers is not None:
             for tracker in self._trackers:
-                _LOGGER.debug(f'Validate Tracker {tracker}')
+                _LOGGER.debug('Validate Tracker %s', tracker)
 
                 current_tracker_domain = tracker.split('.')[0]
 
@@ -141,152 +261,147 @@ class HomeAutomationManagerData:
 
         self._hass.services.call(GROUP_DOMAIN, set_group_service, group_data, False)
 
-    def get_current_date_time(self):
-        return self._current_date_time
+    def get_snapshot(self):
+        return self._snapshot
 
-    def update_current_date_time(self):
-        _LOGGER.debug("update_current_date_time - Start")
+    def resolve_current_date_time(self, boundary=None):
+        """Current date and time, not earlier than the boundary of the refresh (timer fired ahead of it)."""
+        current_date_time = dt_util.now()
 
-        self._current_date_time = datetime.now()
+        if boundary is not None and current_date_time < boundary:
+            current_date_time = boundary
 
-        _LOGGER.debug(f'update_current_date_time - Completed, Current date and time is {self._current_date_time}')
+        _LOGGER.debug('resolve_current_date_time - Completed, Current date and time is %s', current_date_time)
 
-    def get_weekday(self):
-        return self._current_weekday
+        return current_date_time
 
-    def update_weekday(self):
-        _LOGGER.debug("update_weekday - Start")
+    def get_timeline(self, profile_name, current_date):
+        """Return the timeline of the profile (default profile's when it has no parts) compiled for current date."""
+        timeline = self._profiles[profile_name][ATTR_TIMELINE]
 
-        self._current_weekday = self._current_date_time.strftime('%A')
+        if timeline.is_empty():
+            _LOGGER.debug('get_timeline - No parts in %s, using %s', profile_name, DEFAULT_PROFILE)
 
-        _LOGGER.debug(f'update_weekday - Completed, today is {self._current_date_time}')
+            timeline = self._profiles[DEFAULT_PROFILE][ATTR_TIMELINE]
 
-    def get_day_part(self):
-        return self._current_part
+        latitude = self._hass.config.latitude
+        longitude = self._hass.config.longitude
 
-    def update_day_part(self):
-        try:
-            _LOGGER.debug("update_day_part - Start")
+        timeline.compile(current_date, latitude, longitude)
+
+        return timeline
 
-            current_time = self._current_date_time.time()
-            current_profile_name = self.get_current_profile()
+    def resolve_day_part(self, current_profile_name, current_date_time):
+        current_part = self._snapshot.part
 
+        try:
             if current_profile_name not in self._profiles:
-                _LOGGER.warning(f'update_day_part - failed to find profile {current_profile_name} in profiles')
+                _LOGGER.warning('resolve_day_part - failed to find profile %s in profiles', current_profile_name)
             else:
-                current_profile = self._profiles[current_profile_name]
-                parts = current_profile[CONF_PARTS]
+                timeline = self.get_timeline(current_profile_name, current_date_time.date())
+
+                current_part = timeline.get_part(current_date_time.time())
 
-                _LOGGER.debug(f'update_day_part - Available Parts in {current_profile_name} JSON: {parts}')
+                _LOGGER.debug('resolve_day_part - Completed, Current day part is %s', current_part)
+        except Exception as ex:
+            _LOGGER.error('resolve_day_part - Error: %s', ex)
 
-                self._current_part = DAY_PART_TYPES[len(DAY_PART_TYPES) - 1]
+        return current_part
 
-                if parts is not None:
-                    for part_name in parts:
-                        part_from = parts[part_name]
+    def get_skipped_parts(self, previous, snapshot):
+        """Return the parts which started and ended since the previous update (of the same profile)."""
+        skipped_parts = []
 
-                        part_from_time = datetime.strptime(part_from, "%H:%M:%S").time()
+        try:
+            current_profile_name = snapshot.profile
 
-                        log_message = f'Checking {part_name} with from time {part_from_time} comparing {current_time}'
-                        _LOGGER.debug(f'update_day_part - {log_message}')
+            if previous.date_time is not None and previous.profile == current_profile_name and \
+                    current_profile_name in self._profiles:
+                timeline = self.get_timeline(current_profile_name, snapshot.date_time.date())
 
-                        if current_time >= part_from_time:
-                            self._current_part = part_name
+                started_parts = timeline.get_parts_between(previous.date_time, snapshot.date_time)
 
-                _LOGGER.debug(f'update_day_part - Completed, Current day part is {self._current_part}')
+                skipped_parts = started_parts[:-1]
         except Exception as ex:
-            _LOGGER.error(f'updateDayPart - Error: {str(ex)}')
+            _LOGGER.error('get_skipped_parts - Error: %s', ex)
+
+        return skipped_parts
 
     def get_events_of_today(self):
-        return self._events_of_today
+        return self._snapshot.events_of_today
 
     def get_events_of_today_titles(self):
         title = None
         try:
             titles = []
+            events_of_today = self._snapshot.events_of_today
 
-            if self._events_of_today is not None:
-                for event in self._events_of_today:
+            if events_of_today is not None:
+                for event in events_of_today:
                     titles.append(f'{event[CONF_EVENT_TITLE]} ({event[CONF_PROFILE_NAME]})')
 
             title = ', '.join(titles)
         except Exception as ex:
-            _LOGGER.error(f'getEventsOfTodayTitles - Exception {str(ex)}')
+            _LOGGER.error('getEventsOfTodayTitles - Exception %s', ex)
 
         return title
 
-    def update_events_of_today(self):
-        try:
-
-            events = self._events
-
-            if events is None:
-                _LOGGER.debug("update_events_of_today - No overrides available")
-
-                return
-            else:
-                _LOGGER.debug(f'update_events_of_today - Start, Available overrides are: {events}')
-
-            self._events_of_today = []
-
-            current_date = self._current_date_time.today().strftime('%Y-%m-%d')
-            _LOGGER.debug(f'update_events_of_today - Today is {current_date}')
-
-            current_day_name = self.get_weekday()
-
-            for main_event_key in events:
-                main_event = events[main_event_key]
-                for event in main_event:
-                    event_profile = event[CONF_PROFILE_NAME]
-                    event_title = event[CONF_EVENT_TITLE]
+    def resolve_events_of_today(self, current_date):
+        events_of_today = self._snapshot.events_of_today
 
-                    log_message = f'Event {event_title} profile {event_profile} is'
+        try:
+            _LOGGER.debug('resolve_events_of_today - Start, %s overrides available', len(self._events))
 
-                    if main_event_key in [current_day_name, current_date]:
-                        log_message = f''
-                        _LOGGER.debug(f'update_events_of_today - {log_message} from today ({main_event_key})')
-                        self._events_of_today.append(event)
-                    else:
-                        _LOGGER.debug(f'update_events_of_today - {log_message} not from today ({main_event_key})')
+            events_of_today = self._events.get_events(current_date)
 
-            _LOGGER.debug("update_events_of_today - Completed")
+            _LOGGER.debug('resolve_events_of_today - Completed, %s overrides of %s', len(events_of_today), current_date)
         except Exception as ex:
-            _LOGGER.error(f'update_events_of_today - Error {str(ex)}')
+            _LOGGER.error('resolve_events_of_today - Error %s', ex)
 
-    def get_current_scene(self):
-        return self._current_scene
+        return events_of_today
 
-    def update_current_scene(self):
-        is_away = self.get_is_away()
-        current_scene = self.get_day_part()
+    def get_current_scene(self):
+        return self._snapshot.scene
 
+    def get_scene(self, profile, part, is_away, occupancy_level):
+        """Resolve the scene by the scene matrix, part without scene (e.g. added by service) is its own scene."""
         if is_away:
-            current_scene = AWAY_PROFILE
+            return AWAY_PROFILE
 
-        self._current_scene = current_scene
+        return self._scene_matrix.get((profile, part, occupancy_level), part)
 
     def get_profile_data(self, profile):
-        profile_data_all = {}
+        """Return the attributes of the profile, summary only when compact attributes is set."""
+        if self._compact_attributes:
+            return self.get_profile_data_item(profile, ATTR_SUMMARY)
 
-        if self._profile_data is not None and profile in self._profile_data:
-            profile_data = self._profile_data[profile]
+        return self.get_profile_data_item(profile, ATTR_PARTS_EVENTS)
 
-            if ATTR_PARTS_EVENTS in profile_data:
-                profile_data_all = profile_data[ATTR_PARTS_EVENTS]
+    def get_current_profile_data_parts(self, snapshot):
+        profile = snapshot.profile
 
-        return profile_data_all
+        if self._compact_attributes:
+            return self.get_profile_data_item(profile, ATTR_SUMMARY)
 
-    def get_current_profile_data_parts(self):
-        profile = self.get_current_profile()
+        return self.get_profile_data_item(profile, ATTR_PARTS)
 
-        profile_data_parts = {}
+    def get_profile_data_item(self, profile, item):
+        profile_data_item = {}
 
         if self._profile_data is not None and profile in self._profile_data:
             profile_data = self._profile_data[profile]
-            if ATTR_PARTS in profile_data:
-                profile_data_parts = profile_data[ATTR_PARTS]
 
-        return profile_data_parts
+            if item in profile_data:
+                profile_data_item = profile_data[item]
+
+        return profile_data_item
+
+    def fire_profile_event(self, profile):
+        self._hass.bus.fire(EVENT_HAM_PROFILE, {
+            CONF_PROFILE_NAME: profile,
+            ATTR_PARTS: self.get_profile_data_item(profile, ATTR_PARTS),
+            ATTR_PARTS_EVENTS: self.get_profile_data_item(profile, ATTR_PARTS_EVENTS)
+        })
 
     def initialize_profile_data(self):
         self._profile_data = {}
@@ -296,60 +411,222 @@ class HomeAutomationManagerData:
         _LOGGER.debug('Loading HAM Binary Sensors')
 
         for profile_name in all_profiles:
-            profile = all_profiles[profile_name]
-            parts = None
-            events = None
+            self.initialize_profile(profile_name)
+
+    def initialize_profile(self, profile_name):
+        """Build the attributes of a single profile, new objects are created so sensors will detect the change."""
+        profile = self._profiles[profile_name]
+        parts = None
+        events = None
+
+        profile_data = {
+            ATTR_PARTS_EVENTS: {},
+            ATTR_PARTS: {}
+        }
+
+        profile_data_all = profile_data[ATTR_PARTS_EVENTS]
+        profile_data_parts = profile_data[ATTR_PARTS]
+
+        if CONF_PARTS in profile:
+            parts = profile[CONF_PARTS]
+
+        if CONF_EVENTS in profile:
+            events = profile[CONF_EVENTS]
+
+        if parts is not None:
+            timeline = profile[ATTR_TIMELINE]
+
+            for part_name in timeline.get_parts():
+                value = parts[part_name]
+
+                profile_data_all[part_name] = value
+                profile_data_parts[part_name] = value
+
+        if events is not None:
+            for event_id in events:
+                event = events[event_id]
+                event_title = event[CONF_EVENT_TITLE]
+                event_id_arr = event_id.split('.')
+                event_date = event_id_arr[len(event_id_arr) - 1]
+
+                profile_data_all[event_title] = event_date
+
+        profile_data[ATTR_SUMMARY] = {
+            ATTR_PARTS_COUNT: len(profile_data_parts),
+            ATTR_EVENTS_COUNT: 0 if events is None else len(events)
+        }
+
+        self._profile_data[profile_name] = profile_data
+
+    def add_event(self, event):
+        """Add event at runtime, only the index entry and the attributes of its profile are updated."""
+        event_title = event[CONF_EVENT_TITLE]
+        event_profile = event[CONF_PROFILE_NAME]
+
+        if event_profile not in self._profiles or event_profile in SYSTEM_PROFILES:
+            raise ValueError(f'Cannot add event {event_title} since profile {event_profile} is undefined or system')
+
+        transformed_event = HomeAutomationManagerConfigurationTransformer.create_event(event)
+        event_id = transformed_event[ATTR_EVENT_ID]
+        events = self._profiles[event_profile][CONF_EVENTS]
+
+        if event_id in events:
+            raise ValueError(f'{event_profile} already contains event {event_title}')
+
+        self._events.add_event(transformed_event)
+        events[event_id] = HomeAutomationManagerConfigurationTransformer.get_event_details(event)
+
+        self.initialize_profile(event_profile)
+        self._occurrence_window.add_event(transformed_event)
+
+        self._storage.add_event(event_id, event)
+
+        _LOGGER.info('Event %s added', event_id)
+
+    def remove_event(self, event):
+        """Remove events of the profile by title, only the one of the date / day / range when it is set."""
+        event_title = event[CONF_EVENT_TITLE]
+        event_profile = event[CONF_PROFILE_NAME]
+        event_date_time_key = None
+
+        if CONF_EVENT_DATE in event or CONF_EVENT_DAY in event or CONF_EVENT_START in event:
+            event_date_time_key = HomeAutomationManagerConfigurationTransformer.create_event(event)[ATTR_EVENT_KEY]
+
+        if event_profile not in self._profiles:
+            raise ValueError(f'Cannot remove event {event_title} since profile {event_profile} is undefined')
+
+        events = self._profiles[event_profile][CONF_EVENTS]
+        event_ids = []
+
+        for event_id in events:
+            event = self._events.get_event(event_id)
+
+            if event is not None and event[CONF_EVENT_TITLE] == event_title:
+                if event_date_time_key is None or event[ATTR_EVENT_KEY] == event_date_time_key:
+                    event_ids.append(event_id)
+
+        if len(event_ids) == 0:
+            raise ValueError(f'{event_profile} does not contain event {event_title}')
+
+        for event_id in event_ids:
+            self._events.remove_event(event_id)
+            del events[event_id]
+
+            self._storage.remove_event(event_id)
+            self._occurrence_window.remove_event(event_id)
+
+            _LOGGER.info('Event %s removed', event_id)
+
+        self.initialize_profile(event_profile)
+
+    def archive_past_events(self, current_date):
+        """Move the events which their last date has passed from the live configuration to the archive."""
+        try:
+            past_events = self._events.get_past_events(current_date)
+
+            if len(past_events) == 0:
+                return
+
+            records = []
+            profile_names = set()
+            archived = dt_util.now().isoformat()
+
+            for event in past_events:
+                event_id = event[ATTR_EVENT_ID]
+                event_profile = event[CONF_PROFILE_NAME]
+                last_date = self._events.get_last_date(event)
+
+                self._events.remove_event(event_id)
+
+                record = {
+                    ATTR_EVENT_ID: event_id,
+                    CONF_PROFILE_NAME: event_profile,
+                    ATTR_LAST_DATE: last_date.isoformat(),
+                    ATTR_ARCHIVED: archived
+                }
+
+                event_details = self._profiles[event_profile][CONF_EVENTS].pop(event_id, None)
+
+                if event_details is not None:
+                    record.update(event_details)
+                else:
+                    record[CONF_EVENT_TITLE] = event[CONF_EVENT_TITLE]
+
+                records.append(record)
+                profile_names.add(event_profile)
+
+                self._storage.archive_event(event_id)
 
-            self._profile_data[profile_name] = {
-                ATTR_PARTS_EVENTS: {},
-                ATTR_PARTS: {}
-            }
+            for profile_name in profile_names:
+                self.initialize_profile(profile_name)
 
-            profile_data_all = self._profile_data[profile_name][ATTR_PARTS_EVENTS]
-            profile_data_parts = self._profile_data[profile_name][ATTR_PARTS]
+            archived_count = self._archive.append(records)
 
-            if CONF_PARTS in profile:
-                parts = profile[CONF_PARTS]
+            _LOGGER.info('%s past events retired before %s, %s of them archived (others were archived before)',
+                         len(records), current_date, archived_count)
+        except Exception as ex:
+            _LOGGER.error('archive_past_events - Error: %s', ex)
+
+    def fire_archive_event(self, filters):
+        events = self._archive.query(filters.get(CONF_PROFILE_NAME),
+                                     filters.get(CONF_EVENT_TITLE),
+                                     filters.get(ATTR_SINCE),
+                                     filters.get(ATTR_UNTIL),
+                                     filters.get(ATTR_LIMIT))
+
+        self._hass.bus.fire(EVENT_HAM_ARCHIVE, {
+            ATTR_ARCHIVED_EVENTS: events
+        })
 
-            if CONF_EVENTS in profile:
-                events = profile[CONF_EVENTS]
+    def set_part(self, profile_name, part_name, part_from):
+        """Set part of the profile at runtime, None as part_from removes the part."""
+        if profile_name not in self._profiles or self._profiles[profile_name][CONF_PARTS] is None:
+            raise ValueError(f'Cannot set part {part_name} since profile {profile_name} is undefined or has no parts')
 
-            if parts is not None:
-                for part_name in parts:
-                    value = parts[part_name]
+        profile = self._profiles[profile_name]
+        parts = profile[CONF_PARTS]
+        timeline = profile[ATTR_TIMELINE]
 
-                    profile_data_all[part_name] = value
-                    profile_data_parts[part_name] = value
+        if part_from is None:
+            if part_name not in parts:
+                raise ValueError(f'{profile_name} does not contain part {part_name}')
 
-            if events is not None:
-                for event_id in events:
-                    event = events[event_id]
-                    event_title = event[CONF_EVENT_TITLE]
-                    event_id_arr = event_id.split('.')
-                    event_date = event_id_arr[len(event_id_arr) - 1]
+            del parts[part_name]
+            timeline.remove_part(part_name)
+        else:
+            timeline.set_part(part_name, parse_part_from(part_from))
+            parts[part_name] = part_from
 
-                    profile_data_all[event_title] = event_date
+        self.initialize_profile(profile_name)
+
+        self._storage.set_part(profile_name, part_name, part_from)
+
+        _LOGGER.info('Part %s of %s set to %s', part_name, profile_name, part_from)
 
     def get_current_profile(self):
-        return self._current_profile
+        return self._snapshot.profile
+
+    def resolve_current_profile(self, events):
+        current_profile = DEFAULT_PROFILE
 
-    def update_current_profile(self):
         try:
-            _LOGGER.debug("update_current_profile - Start")
+            rule_profile = self._profile_rules.get_profile()
 
-            self._current_profile = DEFAULT_PROFILE
-            events = self.get_events_of_today()
+            if rule_profile is not None:
+                current_profile = rule_profile
 
-            if events is not None:
+            elif events is not None:
                 for event in events:
                     event_profile = event[CONF_PROFILE_NAME]
 
-                    if self._current_profile != self._custom_profiles[len(self._custom_profiles) - 1]:
-                        self._current_profile = event_profile
+                    if current_profile != self._custom_profiles[len(self._custom_profiles) - 1]:
+                        current_profile = event_profile
 
-            _LOGGER.debug(f'update_current_profile - Completed, Profile of today is {self._current_profile}')
+            _LOGGER.debug('resolve_current_profile - Completed, Profile of today is %s', current_profile)
         except Exception as ex:
-            _LOGGER.error(f'update_current_profile - Error: {str(ex)}')
+            _LOGGER.error('resolve_current_profile - Error: %s', ex)
+
+        return current_profile
 
     def get_details(self):
         return self._latest_details
@@ -357,50 +634,332 @@ class HomeAutomationManagerData:
     def get_profiles(self):
         return self._profiles
 
-    def get_is_away(self):
-        return self._is_away
+    def initialize_occupancy(self):
+        for tracker in self._occupancy.get_trackers():
+            state_obj = self._hass.states.get(tracker)
+            state = None if state_obj is None else state_obj.state
+
+            self._occupancy.set_tracker_state(tracker, state)
+
+    def initialize_profile_rules(self):
+        for entity_id in self._profile_rules.get_entities():
+            state_obj = self._hass.states.get(entity_id)
+            state = None if state_obj is None else state_obj.state
+
+            self._profile_rules.set_state(entity_id, state)
+
+    def get_occupancy_count(self, snapshot):
+        return None if snapshot.present_trackers is None else len(snapshot.present_trackers)
+
+    def get_occupancy_attributes(self, snapshot):
+        attributes = {
+            ATTR_OCCUPANCY_LEVEL: snapshot.occupancy_level,
+            ATTR_PRESENT_TRACKERS: None if snapshot.present_trackers is None else list(snapshot.present_trackers)
+        }
+
+        return attributes
+
+    def invoke_current_scene(self):
+        return self.invoke_scenes(True)
+
+    def invoke_scenes(self, is_rerun=False):
+        """
+        Invoke the scenes of the latest snapshot, invocations are serialized without waiting for the running one:
+        scene scripts may call HAM services, request made while scenes are invoked is handled by the running caller.
+        """
+        with self._scene_request_lock:
+            self._is_scene_requested = True
+            self._is_scene_rerun = self._is_scene_rerun or is_rerun
+
+            if not self._scene_lock.acquire(False):
+                return SCRIPT_OUTCOME_SKIPPED
+
+        outcome = SCRIPT_OUTCOME_SKIPPED
+
+        while True:
+            with self._scene_request_lock:
+                if not self._is_scene_requested:
+                    self._scene_lock.release()
+
+                    return outcome
+
+                is_rerun = self._is_scene_rerun
+
+                self._is_scene_requested = False
+                self._is_scene_rerun = False
+
+            try:
+                outcome = self.invoke_snapshot_scenes(is_rerun)
+            except Exception as ex:
+                _LOGGER.error('invoke_scenes - Error: %s', ex)
+
+                outcome = SCRIPT_OUTCOME_FAILED
+
+    def invoke_snapshot_scenes(self, is_rerun):
+        """Invoke the scenes of the snapshots published since the last invocation, must hold the scene lock."""
+        previous = self._scene_snapshot
+        snapshot = self._snapshot
+        outcome = SCRIPT_OUTCOME_SKIPPED
+
+        self._scene_snapshot = snapshot
+
+        if snapshot is not previous and previous.scene is not None:
+            self.catch_up_skipped_parts(previous, snapshot)
+
+            if previous.scene != snapshot.scene:
+                outcome = self.invoke_scene(snapshot.scene, snapshot.boundary)
+
+        if is_rerun and outcome == SCRIPT_OUTCOME_SKIPPED:
+            outcome = self.invoke_scene(snapshot.scene)
+
+        if snapshot is not previous and snapshot.is_changed(previous):
+            self._history.append(snapshot.date_time, snapshot.source,
+                                 previous.profile, snapshot.profile,
+                                 previous.part, snapshot.part,
+                                 previous.scene, snapshot.scene,
+                                 snapshot.is_away, outcome)
+
+        return outcome
+
+    def invoke_scene(self, current_scene, boundary=None):
+        """Invoke the script of the scene, must hold the scene lock."""
+        return self._profiler.run_scene(self.run_scene_script, current_scene, boundary)
+
+    def run_scene_script(self, current_scene, boundary=None):
+        outcome = SCRIPT_OUTCOME_NO_SCRIPT
+
+        _LOGGER.debug('Invoking script of %s', current_scene)
 
-    def update_is_away(self):
         try:
-            _LOGGER.debug("update_is_away - Start")
+            script_invoker = self._transition_scheduler.pop_prepared_script(current_scene)
+
+            if script_invoker is None:
+                script_invoker = self.create_scene_script(current_scene)
 
-            group_tracker_state = self._hass.states.get(self._group_trackers_id).state
+            if script_invoker is not None:
+                context = None
 
-            self._is_away = group_tracker_state in TRACKERS_AWAY_STATES
+                if boundary is not None:
+                    context = Context()
 
-            _LOGGER.debug(f'update_is_away - Completed, Away state is {self._is_away}')
+                    self.measure_transition_latency(boundary, context)
+
+                script_invoker.run(context=context)
+
+                outcome = SCRIPT_OUTCOME_STARTED
         except Exception as ex:
-            _LOGGER.error(f'update_is_away - Error: {str(ex)}')
+            _LOGGER.error('run_scene_script - Error: %s', ex)
 
-    def invoke_current_scene(self):
-        current_scene = self.get_current_scene()
+            outcome = SCRIPT_OUTCOME_FAILED
 
-        _LOGGER.debug(f'Invoking script of {current_scene}')
+        return outcome
 
-        if self._scenes is not None and current_scene in self._scenes:
-            scene = self._scenes[current_scene]
+    def create_scene_script(self, scene_name):
+        script_invoker = None
+
+        if self._scenes is not None and scene_name in self._scenes:
+            scene = self._scenes[scene_name]
 
             if CONF_SCENE_SCRIPT in scene:
                 scene_script = scene[CONF_SCENE_SCRIPT]
 
                 if scene_script is not None:
                     script_invoker = Script(self._hass, scene_script)
-                    script_invoker.run()
 
-    def update(self):
-        _LOGGER.debug("update - Start")
+        return script_invoker
+
+    def prepare_scene(self, part):
+        """Resolve the scene of the part (as of now) and create its script ahead of the transition."""
+        snapshot = self._snapshot
+        scene = self.get_scene(snapshot.profile, part, snapshot.is_away, snapshot.occupancy_level)
+
+        return scene, self.create_scene_script(scene)
+
+    def schedule_next_transition(self, snapshot):
+        try:
+            current_profile_name = snapshot.profile
+            boundary, part = None, None
+
+            if current_profile_name in self._profiles:
+                timeline = self.get_timeline(current_profile_name, snapshot.date_time.date())
+                boundary, part = timeline.get_next_boundary(snapshot.date_time)
+
+            self._transition_scheduler.schedule(boundary, part)
+        except Exception as ex:
+            _LOGGER.error('schedule_next_transition - Error: %s', ex)
+
+    def measure_transition_latency(self, boundary, context):
+        """
+        Measure the latency from the boundary to the first service call of the script (matched by its context),
+        listener is removed once matched or when no service was called until the timeout.
+        """
+        boundary_utc = dt_util.as_utc(boundary)
+        listener = {}
 
-        current_scene = self.get_current_scene()
+        def remove_listener():
+            remove_service_listener = listener.pop(EVENT_CALL_SERVICE, None)
 
-        self.update_current_date_time()
-        self.update_weekday()
-        self.update_events_of_today()
-        self.update_is_away()
-        self.update_current_profile()
-        self.update_day_part()
-        self.update_current_scene()
+            if remove_service_listener is not None:
+                remove_service_listener()
 
-        if current_scene is not None and current_scene != self.get_current_scene():
-            self.invoke_current_scene()
+            return remove_service_listener is not None
+
+        def service_called(event):
+            if event.context is None or event.context.id != context.id:
+                return
+
+            if remove_listener():
+                self._scheduling_monitor.record_transition_latency(event.time_fired - boundary_utc)
+
+        def timed_out(event_time):
+            if remove_listener():
+                _LOGGER.debug('No service was called by the script of transition at %s', boundary)
+
+        listener[EVENT_CALL_SERVICE] = self._hass.bus.listen(EVENT_CALL_SERVICE, service_called)
+
+        track_point_in_time(self._hass, timed_out, dt_util.utcnow() + TRANSITION_LATENCY_TIMEOUT)
+
+    def get_history(self):
+        return self._history
+
+    def fire_history_event(self, filters):
+        since = filters.get(ATTR_SINCE)
+
+        if since is not None:
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=dt_util.now().tzinfo)
+
+            since = dt_util.as_local(since)
+
+        transitions = self._history.query(filters.get(ATTR_SOURCE),
+                                          filters.get(CONF_PROFILE_NAME),
+                                          filters.get(ATTR_SCENE),
+                                          since,
+                                          filters.get(ATTR_LIMIT))
+
+        self._hass.bus.fire(EVENT_HAM_HISTORY, {
+            ATTR_TRANSITIONS: transitions
+        })
+
+    def catch_up_skipped_parts(self, previous, snapshot):
+        """Detect parts skipped since the previous update and replay their scenes when configured."""
+        skipped_parts = self.get_skipped_parts(previous, snapshot)
+
+        if len(skipped_parts) == 0:
+            return
+
+        is_replayed = self._catch_up == CATCH_UP_REPLAY
+
+        _LOGGER.warning('Parts %s were skipped since %s, catch up policy: %s',
+                        skipped_parts, previous.date_time, self._catch_up)
+
+        self._scheduling_monitor.record_missed_transitions(len(skipped_parts), is_replayed)
+
+        if is_replayed:
+            invoked_scene = previous.scene
+
+            for part in skipped_parts:
+                scene = self.get_scene(previous.profile, part, snapshot.is_away, snapshot.occupancy_level)
+
+                if scene != invoked_scene:
+                    self.invoke_scene(scene)
+
+                    invoked_scene = scene
+
+    def get_calendar_events(self, start_date, end_date):
+        return self._occurrence_window.get_occurrences(start_date, end_date)
+
+    def get_next_calendar_event(self, snapshot):
+        current_date_time = snapshot.date_time
+        calendar_event = None
+
+        if current_date_time is not None:
+            calendar_event = self._occurrence_window.get_next_occurrence(current_date_time.date())
+
+        return calendar_event
+
+    def get_scheduling_lag(self, snapshot):
+        """Scheduling counters are recorded per update, outside the snapshot."""
+        return self._scheduling_monitor.get_lag()
+
+    def get_scheduling_statistics(self, snapshot):
+        statistics = self._scheduling_monitor.get_statistics()
+
+        next_transition = self._transition_scheduler.get_boundary()
+        statistics[ATTR_NEXT_TRANSITION] = None if next_transition is None else next_transition.isoformat()
+
+        return statistics
+
+    def update(self, source=SOURCE_INTERVAL, boundary=None):
+        """
+        Resolve a new snapshot and publish it by replacing the reference, readers are not locked,
+        concurrent updates (interval, state change, service) are serialized.
+        Scenes are invoked once the update lock is released, scene scripts may call HAM services.
+        Boundary is set only by the refresh of a scheduled part transition.
+        """
+        with self._update_lock:
+            _LOGGER.debug("update - Start")
+
+            trace_sample = self._tracer.sample(source)
+            previous = self._snapshot
+
+            current_date_time = self.resolve_current_date_time(boundary)
+
+            if previous.date_time is None or previous.date_time.date() != current_date_time.date():
+                self.archive_past_events(current_date_time.date())
+
+            events_of_today = self.resolve_events_of_today(current_date_time.date())
+            present_trackers = self._occupancy.get_present()
+            occupancy_level = self._occupancy.get_level(len(present_trackers))
+            is_away = self._occupancy.is_away(len(present_trackers))
+            current_profile = self.resolve_current_profile(events_of_today)
+            current_part = self.resolve_day_part(current_profile, current_date_time)
+            current_scene = self.get_scene(current_profile, current_part, is_away, occupancy_level)
+
+            snapshot = HomeAutomationManagerSnapshot(current_date_time, current_date_time.strftime('%A'),
+                                                     events_of_today, is_away,
+                                                     current_profile, current_part, current_scene,
+                                                     occupancy_level, present_trackers, source, boundary)
+
+            self._snapshot = snapshot
+
+            if trace_sample is not None:
+                trace_sample.mark(TRACE_STEP_RESOLVE)
+
+            self._scheduling_monitor.record_update(source, current_date_time)
+
+            self._occurrence_window.extend(current_date_time.date())
+
+            if trace_sample is not None:
+                trace_sample.mark(TRACE_STEP_CALENDAR)
+
+            self.schedule_next_transition(snapshot)
+
+            if trace_sample is not None:
+                trace_sample.mark(TRACE_STEP_SCHEDULE)
+
+        outcome = self.invoke_scenes()
+
+        if trace_sample is not None:
+            trace_sample.mark(TRACE_STEP_SCENES)
+
+            self.trace_update(trace_sample, snapshot, outcome)
 
         _LOGGER.debug("update - Completed")
+
+    def trace_update(self, trace_sample, snapshot, outcome):
+        """Complete and log the sampled trace of the refresh."""
+        next_transition = self._transition_scheduler.get_boundary()
+
+        trace_sample.set(ATTR_TIMESTAMP, snapshot.date_time.isoformat())
+        trace_sample.set(ATTR_CURRENT_PROFILE, snapshot.profile)
+        trace_sample.set(ATTR_DAY_PART, snapshot.part)
+        trace_sample.set(ATTR_CURRENT_SCENE, snapshot.scene)
+        trace_sample.set(ATTR_IS_AWAY, snapshot.is_away)
+        trace_sample.set(ATTR_OCCUPANCY, snapshot.occupancy_level)
+        trace_sample.set(ATTR_TRACE_EVENTS, self.get_events_of_today_titles())
+        trace_sample.set(ATTR_OUTCOME, outcome)
+        trace_sample.set(ATTR_UPDATES, self._scheduling_monitor.get_updates())
+        trace_sample.set(ATTR_NEXT_TRANSITION, None if next_transition is None else next_transition.isoformat())
+
+        self._tracer.log(trace_sample)
@@ -0,0 +1,101 @@
+"""Bounded history of the profile, day part and scene transitions."""
+import logging
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerTransition:
+    """Single transition of profile / part / scene."""
+
+    __slots__ = ['timestamp', 'source', 'old_profile', 'new_profile', 'old_part', 'new_part',
+                 'old_scene', 'new_scene', 'is_away', 'outcome']
+
+    def __init__(self, timestamp, source, old_profile, new_profile, old_part, new_part,
+                 old_scene, new_scene, is_away, outcome):
+        self.timestamp = timestamp
+        self.source = source
+        self.old_profile = old_profile
+        self.new_profile = new_profile
+        self.old_part = old_part
+        self.new_part = new_part
+        self.old_scene = old_scene
+        self.new_scene = new_scene
+        self.is_away = is_away
+        self.outcome = outcome
+
+    def is_matched(self, source, profile, scene, since):
+        if source is not None and self.source != source:
+            return False
+
+        if profile is not None and profile not in [self.old_profile, self.new_profile]:
+            return False
+
+        if scene is not None and scene not in [self.old_scene, self.new_scene]:
+            return False
+
+        if since is not None and self.timestamp < since:
+            return False
+
+        return True
+
+    def to_dict(self):
+        data = {
+            ATTR_TIMESTAMP: self.timestamp.isoformat(),
+            ATTR_SOURCE: self.source,
+            ATTR_OLD_PROFILE: self.old_profile,
+            ATTR_NEW_PROFILE: self.new_profile,
+            ATTR_OLD_PART: self.old_part,
+            ATTR_NEW_PART: self.new_part,
+            ATTR_OLD_SCENE: self.old_scene,
+            ATTR_NEW_SCENE: self.new_scene,
+            ATTR_IS_AWAY: self.is_away,
+            ATTR_OUTCOME: self.outcome
+        }
+
+        return data
+
+
+class HomeAutomationManagerHistory:
+    """Fixed size ring buffer of transitions, the oldest transition is overwritten once full."""
+
+    def __init__(self, size):
+        self._size = size
+        self._records = [None] * size
+        self._next_index = 0
+        self._count = 0
+
+    def append(self, timestamp, source, old_profile, new_profile, old_part, new_part,
+               old_scene, new_scene, is_away, outcome):
+        if self._size == 0:
+            return
+
+        self._records[self._next_index] = HomeAutomationManagerTransition(timestamp, source,
+                                                                          old_profile, new_profile,
+                                                                          old_part, new_part,
+                                                                          old_scene, new_scene,
+                                                                          is_away, outcome)
+
+        self._next_index = (self._next_index + 1) % self._size
+
+        if self._count < self._size:
+            self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def query(self, source=None, profile=None, scene=None, since=None, limit=None):
+        """Return matching transitions, latest first."""
+        result = []
+
+        for offset in range(1, self._count + 1):
+            if limit is not None and len(result) >= limit:
+                break
+
+            record = self._records[(self._next_index - offset) % self._size]
+
+            if record.is_matched(source, profile, scene, since):
+                result.append(record.to_dict())
+
+        return result
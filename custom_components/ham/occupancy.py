@@ -0,0 +1,59 @@
+"""Occupancy level by the present trackers."""
+import logging
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerOccupancy:
+    """Present trackers, maintained from the state changes of each tracker."""
+
+    def __init__(self, trackers):
+        self._trackers = set()
+        self._present = set()
+
+        if trackers is not None:
+            self._trackers.update(trackers)
+
+    def is_tracker(self, entity_id):
+        return entity_id in self._trackers
+
+    def get_trackers(self):
+        return self._trackers
+
+    def set_tracker_state(self, entity_id, state):
+        """
+        Apply the new state of a tracker, returns whether the present trackers were changed.
+        Unknown or unavailable state (e.g. integration outage) keeps the previous presence of the tracker.
+        """
+        if state in TRACKERS_IGNORED_STATES:
+            return False
+
+        was_present = entity_id in self._present
+
+        if state == STATE_HOME:
+            self._present.add(entity_id)
+        else:
+            self._present.discard(entity_id)
+
+        return was_present != (entity_id in self._present)
+
+    def get_present(self):
+        """Present trackers, copied once so level and away state of a snapshot are resolved from the same set."""
+        return tuple(sorted(self._present))
+
+    def get_level(self, count):
+        if count == 0:
+            level = OCCUPANCY_EMPTY
+        elif count == len(self._trackers):
+            level = OCCUPANCY_FULL
+        elif count == 1:
+            level = OCCUPANCY_SINGLE
+        else:
+            level = OCCUPANCY_PARTIAL
+
+        return level
+
+    def is_away(self, count):
+        return len(self._trackers) > 0 and count == 0
@@ -0,0 +1,200 @@
+"""Precomputed window of event occurrences for the calendar."""
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerOccurrenceWindow:
+    """
+    Occurrences of the events in the next days, sorted by date and expanded ahead of the calendar queries.
+    Date range is a single occurrence of all its days (clipped to the window), other events occur per day.
+    Window is extended by the days passed since it was expanded, calendar queries slice it with a binary search,
+    runtime changes add or remove only the occurrences of the changed event.
+    """
+
+    def __init__(self, events, days):
+        self._events = events
+        self._days = timedelta(days=days)
+        self._lock = threading.Lock()
+        self._is_valid = False
+        self._window = (None, None, [], [], [], [])
+
+    def extend(self, current_date):
+        """Move the window to start at current_date, only the days not expanded yet are expanded."""
+        with self._lock:
+            start_date, end_date, dates, event_ids, occurrences, _ = self._window
+
+            if self._is_valid and start_date == current_date:
+                return
+
+            new_end_date = current_date + self._days
+
+            if not self._is_valid or start_date is None or not start_date < current_date <= end_date:
+                self._is_valid = True
+
+                new_dates, new_event_ids, new_occurrences = self.expand(current_date, new_end_date)
+
+                _LOGGER.debug('Occurrences window expanded from %s until %s', current_date, new_end_date)
+            else:
+                index = bisect_left(dates, current_date.toordinal())
+
+                added_dates, added_event_ids, added_occurrences = self.expand(end_date, new_end_date)
+
+                new_dates = dates[index:] + added_dates
+                new_event_ids = event_ids[index:] + added_event_ids
+                new_occurrences = occurrences[index:] + added_occurrences
+
+                _LOGGER.debug('Occurrences window extended from %s until %s', end_date, new_end_date)
+
+            ranges = self.expand_ranges(current_date, new_end_date)
+
+            self._window = (current_date, new_end_date, new_dates, new_event_ids, new_occurrences, ranges)
+
+    def expand(self, start_date, end_date):
+        """Return the dates (ordinal), event ids and daily occurrences from start_date until end_date (exclusive)."""
+        dates = []
+        event_ids = []
+        occurrences = []
+        current_date = start_date
+
+        while current_date < end_date:
+            for event in self._events.get_events(current_date):
+                if not self.is_range(event):
+                    dates.append(current_date.toordinal())
+                    event_ids.append(event[ATTR_EVENT_ID])
+                    occurrences.append(self.create_occurrence(current_date, current_date, event))
+
+            current_date += timedelta(days=1)
+
+        return dates, event_ids, occurrences
+
+    def expand_ranges(self, start_date, end_date):
+        """Return the occurrences of the date ranges within start_date until end_date (exclusive), by start."""
+        ranges = []
+
+        for event in self._events.get_range_events(start_date, end_date - timedelta(days=1)):
+            ranges.append(self.create_range(start_date, end_date, event))
+
+        ranges.sort(key=lambda item: item[0])
+
+        return ranges
+
+    def create_range(self, start_date, end_date, event):
+        """Range entry of (first, last date ordinal, event id, occurrence), clipped to the window."""
+        first_date = max(event[ATTR_EVENT_START_DATE], start_date)
+        last_date = min(self._events.get_last_date(event), end_date - timedelta(days=1))
+
+        return first_date.toordinal(), last_date.toordinal(), event[ATTR_EVENT_ID], \
+            self.create_occurrence(first_date, last_date, event)
+
+    @staticmethod
+    def is_range(event):
+        return CONF_EVENT_START in event and event[ATTR_EVENT_RECURRENCE] is None
+
+    @staticmethod
+    def create_occurrence(first_date, last_date, event):
+        """All day calendar event of the occurrence, from first_date until last_date (inclusive)."""
+        occurrence = {
+            ATTR_CALENDAR_SUMMARY: f'{event[CONF_EVENT_TITLE]} ({event[CONF_PROFILE_NAME]})',
+            ATTR_CALENDAR_DESCRIPTION: event[CONF_PROFILE_NAME],
+            ATTR_CALENDAR_START: {
+                ATTR_CALENDAR_DATE: first_date.strftime(EVENT_DATE_FORMAT)
+            },
+            ATTR_CALENDAR_END: {
+                ATTR_CALENDAR_DATE: (last_date + timedelta(days=1)).strftime(EVENT_DATE_FORMAT)
+            }
+        }
+
+        return occurrence
+
+    def add_event(self, event):
+        """Add the occurrences of the event added at runtime, other occurrences are kept."""
+        with self._lock:
+            if not self._is_valid:
+                return
+
+            start_date, end_date, dates, event_ids, occurrences, ranges = self._window
+            last_date = self._events.get_last_date(event)
+
+            if self.is_range(event):
+                if event[ATTR_EVENT_START_DATE] < end_date and last_date >= start_date:
+                    ranges = ranges + [self.create_range(start_date, end_date, event)]
+                    ranges.sort(key=lambda item: item[0])
+            else:
+                dates = list(dates)
+                event_ids = list(event_ids)
+                occurrences = list(occurrences)
+                current_date = start_date
+
+                if last_date is not None and last_date < end_date:
+                    end_date = last_date + timedelta(days=1)
+
+                while current_date < end_date:
+                    if self._events.occurs_on(event, current_date):
+                        index = bisect_right(dates, current_date.toordinal())
+
+                        dates.insert(index, current_date.toordinal())
+                        event_ids.insert(index, event[ATTR_EVENT_ID])
+                        occurrences.insert(index, self.create_occurrence(current_date, current_date, event))
+
+                    current_date += timedelta(days=1)
+
+            self._window = (self._window[0], self._window[1], dates, event_ids, occurrences, ranges)
+
+    def remove_event(self, event_id):
+        """Remove the occurrences of the event removed at runtime, other occurrences are kept."""
+        with self._lock:
+            start_date, end_date, dates, event_ids, occurrences, ranges = self._window
+            indexes = [index for index in range(len(event_ids)) if event_ids[index] != event_id]
+
+            self._window = (start_date, end_date,
+                            [dates[index] for index in indexes],
+                            [event_ids[index] for index in indexes],
+                            [occurrences[index] for index in indexes],
+                            [item for item in ranges if item[2] != event_id])
+
+    def get_occurrences(self, start_date, end_date):
+        """Return the occurrences from start_date until end_date (inclusive) within the window."""
+        _, _, dates, _, occurrences, ranges = self._window
+
+        start_index = bisect_left(dates, start_date.toordinal())
+        end_index = bisect_right(dates, end_date.toordinal())
+
+        result = occurrences[start_index:end_index]
+
+        for first_date, last_date, _, occurrence in ranges:
+            if first_date <= end_date.toordinal() and last_date >= start_date.toordinal():
+                result.append(occurrence)
+
+        result.sort(key=lambda item: item[ATTR_CALENDAR_START][ATTR_CALENDAR_DATE])
+
+        return result
+
+    def get_next_occurrence(self, current_date):
+        """Return the first occurrence of current_date (including a range in progress) or later within the window."""
+        _, _, dates, _, occurrences, ranges = self._window
+
+        index = bisect_left(dates, current_date.toordinal())
+        occurrence = None
+        occurrence_date = None
+
+        if index < len(occurrences):
+            occurrence = occurrences[index]
+            occurrence_date = dates[index]
+
+        for first_date, last_date, _, range_occurrence in ranges:
+            if last_date < current_date.toordinal():
+                continue
+
+            first_date = max(first_date, current_date.toordinal())
+
+            if occurrence_date is None or first_date <= occurrence_date:
+                occurrence = range_occurrence
+                occurrence_date = first_date
+
+        return occurrence
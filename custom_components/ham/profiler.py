@@ -0,0 +1,130 @@
+"""On demand profiling of HAM refresh cycles."""
+import cProfile
+import io
+import logging
+import pstats
+import threading
+
+import homeassistant.util.dt as dt_util
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerProfiler:
+    """Profile the next refresh cycles on demand, switched off automatically once done."""
+
+    def __init__(self, hass, create_notification):
+        self._hass = hass
+        self._create_notification = create_notification
+        self._lock = threading.Lock()
+        self._profile = None
+        self._remaining_cycles = 0
+        self._profiled_cycles = 0
+        self._include_scenes = False
+        self._started_at = None
+        self._active_thread = None
+
+    def is_active(self):
+        return self._profile is not None
+
+    def start(self, cycles, include_scenes):
+        with self._lock:
+            if self._profile is not None:
+                _LOGGER.warning('Profiling is already running, request ignored')
+                return
+
+            self._profile = cProfile.Profile()
+            self._remaining_cycles = cycles
+            self._profiled_cycles = 0
+            self._include_scenes = include_scenes
+            self._started_at = dt_util.now()
+
+        _LOGGER.info('Profiling next %s refresh cycles, including scenes: %s', cycles, include_scenes)
+
+    def run(self, func, *args):
+        """Run refresh cycle, profiled when profiling is active and no other cycle is profiled at the moment."""
+        with self._lock:
+            profile = self._profile
+
+            if profile is not None and dt_util.now() - self._started_at > PROFILER_MAX_DURATION:
+                _LOGGER.warning('Profiling did not complete within %s, stopping', PROFILER_MAX_DURATION)
+
+                self.finish()
+
+                profile = None
+
+            if profile is None or self._active_thread is not None:
+                profile = None
+            else:
+                self._active_thread = threading.get_ident()
+
+        if profile is None:
+            return func(*args)
+
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            with self._lock:
+                self._active_thread = None
+                self._profiled_cycles += 1
+                self._remaining_cycles -= 1
+
+                if self._remaining_cycles <= 0:
+                    self.finish()
+
+    def run_scene(self, func, *args):
+        """Run scene invocation, excluded from the profile unless requested."""
+        profile = self._profile
+
+        is_paused = profile is not None and not self._include_scenes and \
+            self._active_thread == threading.get_ident()
+
+        if is_paused:
+            profile.disable()
+
+        try:
+            return func(*args)
+        finally:
+            if is_paused:
+                profile.enable()
+
+    def finish(self):
+        """Write the stats and notify, must be called while holding the lock."""
+        profile = self._profile
+
+        self._profile = None
+
+        if profile is None or self._profiled_cycles == 0:
+            return
+
+        try:
+            stream = io.StringIO()
+
+            stats = pstats.Stats(profile, stream=stream)
+            stats.sort_stats(PROFILER_SORT_KEY)
+            stats.print_stats()
+
+            file_name = f'{DOMAIN}_profile_{dt_util.now().strftime("%Y%m%d%H%M%S")}.txt'
+            file_path = self._hass.config.path(file_name)
+
+            with open(file_path, 'w') as file:
+                file.write(stream.getvalue())
+
+            hot_spots = []
+            stats_items = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+
+            for (source_file, line, function_name), (_, calls, total_time, cumulative_time, _) in \
+                    stats_items[:PROFILER_HOT_SPOTS]:
+                hot_spots.append(f'{function_name} ({source_file}:{line}) - '
+                                 f'{total_time:.4f}s own, {cumulative_time:.4f}s cumulative, {calls} calls')
+
+            message = f'Profiled {self._profiled_cycles} refresh cycles, stats: {file_path}<br /><br />' \
+                      f'Top hot spots:<br /> - ' + '<br /> - '.join(hot_spots)
+
+            self._create_notification(message)
+
+            _LOGGER.info('Profiling completed, stats: %s', file_path)
+        except Exception as ex:
+            _LOGGER.error('Failed to write profiling stats, error: %s', ex)
@@ -0,0 +1,72 @@
+"""Profile selection by rules of entity states."""
+import logging
+from bisect import bisect_left, insort
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerRules:
+    """
+    Profile rules by entity conditions, the first matched rule (by configuration order) selects the profile.
+    Rules are indexed by the entities they reference, state change re-evaluates only the rules of the entity.
+    """
+
+    def __init__(self, rules):
+        self._rules = rules
+        self._rules_by_entity = {}
+        self._states = {}
+        self._matched_rules = []
+
+        for rule_index in range(len(rules)):
+            for entity_id, state in rules[rule_index][CONF_RULE_CONDITIONS]:
+                entity_rules = self._rules_by_entity.setdefault(entity_id, [])
+
+                if rule_index not in entity_rules:
+                    entity_rules.append(rule_index)
+
+                self._states[entity_id] = None
+
+    def is_dependency(self, entity_id):
+        return entity_id in self._rules_by_entity
+
+    def get_entities(self):
+        return list(self._rules_by_entity.keys())
+
+    def set_state(self, entity_id, state):
+        """Set state of entity and re-evaluate its rules, returns whether the selected profile was changed."""
+        if self._states.get(entity_id) == state:
+            return False
+
+        profile = self.get_profile()
+
+        self._states[entity_id] = state
+
+        for rule_index in self._rules_by_entity[entity_id]:
+            is_matched = self.is_matched(rule_index)
+            index = bisect_left(self._matched_rules, rule_index)
+            was_matched = index < len(self._matched_rules) and self._matched_rules[index] == rule_index
+
+            if is_matched and not was_matched:
+                insort(self._matched_rules, rule_index)
+
+            elif was_matched and not is_matched:
+                del self._matched_rules[index]
+
+        return profile != self.get_profile()
+
+    def is_matched(self, rule_index):
+        for entity_id, state in self._rules[rule_index][CONF_RULE_CONDITIONS]:
+            if self._states[entity_id] != state:
+                return False
+
+        return True
+
+    def get_profile(self):
+        profile = None
+
+        if len(self._matched_rules) > 0:
+            profile = self._rules[self._matched_rules[0]][CONF_PROFILE_NAME]
+
+        return profile
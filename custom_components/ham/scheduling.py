@@ -0,0 +1,103 @@
+"""Scheduling lag and missed transitions counters."""
+import logging
+from datetime import timedelta
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerSchedulingMonitor:
+    """Counters of the refresh scheduling lag and of the missed transitions."""
+
+    def __init__(self, scan_interval):
+        self._scan_interval = scan_interval
+        self._last_interval_time = None
+        self._last_lag = timedelta()
+        self._max_lag = timedelta()
+        self._updates = 0
+        self._late_updates = 0
+        self._missed_transitions = 0
+        self._replayed_transitions = 0
+        self._last_latency = None
+        self._max_latency = timedelta()
+        self._total_latency = timedelta()
+        self._measured_transitions = 0
+        self._transitions_over_bound = 0
+
+    def record_update(self, source, current_date_time):
+        """
+        Measure the lag of refresh by interval, comparing to the expected time of the refresh.
+        Only late refreshes are kept as lag, timer jitter of on time refreshes does not change the statistics.
+        """
+        self._updates += 1
+
+        if source != SOURCE_INTERVAL:
+            return
+
+        if self._last_interval_time is not None:
+            lag = current_date_time - self._last_interval_time - self._scan_interval
+
+            if lag < timedelta():
+                lag = timedelta()
+
+            if lag > LATE_UPDATE_THRESHOLD:
+                self._late_updates += 1
+
+                _LOGGER.warning('Refresh of HAM is late by %s', lag)
+            else:
+                lag = timedelta()
+
+            self._last_lag = lag
+
+            if lag > self._max_lag:
+                self._max_lag = lag
+
+        self._last_interval_time = current_date_time
+
+    def record_missed_transitions(self, count, is_replayed):
+        self._missed_transitions += count
+
+        if is_replayed:
+            self._replayed_transitions += count
+
+    def record_transition_latency(self, latency):
+        """Latency from the part boundary to the first service call of its scene."""
+        self._last_latency = latency
+        self._total_latency += latency
+        self._measured_transitions += 1
+
+        if latency > self._max_latency:
+            self._max_latency = latency
+
+        if latency > TRANSITION_LATENCY_BOUND:
+            self._transitions_over_bound += 1
+
+            _LOGGER.warning('Transition latency %s is over %s', latency, TRANSITION_LATENCY_BOUND)
+
+    def get_updates(self):
+        return self._updates
+
+    def get_lag(self):
+        return round(self._last_lag.total_seconds(), 3)
+
+    def get_statistics(self):
+        statistics = {
+            ATTR_MAX_LAG: round(self._max_lag.total_seconds(), 3),
+            ATTR_LATE_UPDATES: self._late_updates,
+            ATTR_MISSED_TRANSITIONS: self._missed_transitions,
+            ATTR_REPLAYED_TRANSITIONS: self._replayed_transitions,
+            ATTR_LAST_TRANSITION_LATENCY: None,
+            ATTR_MAX_TRANSITION_LATENCY: round(self._max_latency.total_seconds(), 3),
+            ATTR_AVERAGE_TRANSITION_LATENCY: None,
+            ATTR_TRANSITIONS_MEASURED: self._measured_transitions,
+            ATTR_TRANSITIONS_OVER_BOUND: self._transitions_over_bound
+        }
+
+        if self._measured_transitions > 0:
+            average_latency = self._total_latency / self._measured_transitions
+
+            statistics[ATTR_LAST_TRANSITION_LATENCY] = round(self._last_latency.total_seconds(), 3)
+            statistics[ATTR_AVERAGE_TRANSITION_LATENCY] = round(average_latency.total_seconds(), 3)
+
+        return statistics
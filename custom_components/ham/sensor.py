@@ -1,7 +1,6 @@
 import logging
+from operator import attrgetter
 
-from homeassistant.core import callback
-from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.components.sensor import DOMAIN as SENSOR_DOMAIN
 from homeassistant.helpers.entity import Entity
 from .const import *
@@ -20,20 +19,28 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     sensors = []
     data_provider = {
             ATTR_WEEKDAY: {
-                ATTR_STATE: ham_data.get_weekday,
+                ATTR_STATE: attrgetter('weekday'),
                 ATTR_ATTRIBUTES: None
             },
             ATTR_DAY_PART: {
-                ATTR_STATE: ham_data.get_day_part,
+                ATTR_STATE: attrgetter('part'),
                 ATTR_ATTRIBUTES: None
             },
             ATTR_CURRENT_PROFILE: {
-                ATTR_STATE: ham_data.get_current_profile,
+                ATTR_STATE: attrgetter('profile'),
                 ATTR_ATTRIBUTES: ham_data.get_current_profile_data_parts
             },
             ATTR_CURRENT_SCENE: {
-                ATTR_STATE: ham_data.get_current_scene,
+                ATTR_STATE: attrgetter('scene'),
                 ATTR_ATTRIBUTES: None
+            },
+            ATTR_OCCUPANCY: {
+                ATTR_STATE: ham_data.get_occupancy_count,
+                ATTR_ATTRIBUTES: ham_data.get_occupancy_attributes
+            },
+            ATTR_SCHEDULING: {
+                ATTR_STATE: ham_data.get_scheduling_lag,
+                ATTR_ATTRIBUTES: ham_data.get_scheduling_statistics
             }
         }
 
@@ -93,6 +100,11 @@ class HomeAutomationManagerSensor(Entity):
     def icon(self):
         return self._icon
 
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement of this sensor."""
+        return SENSOR_TYPES[self._sensor_type][1]
+
     @property
     def device_class(self):
         """Return the class of this sensor."""
@@ -107,20 +119,38 @@ class HomeAutomationManagerSensor(Entity):
     def device_state_attributes(self):
         """Return the state attributes."""
         return self._attributes
+
+    @property
+    def should_poll(self):
+        """No polling needed, state is updated once HAM is refreshed."""
+        return False
      
     async def async_added_to_hass(self):
-        """Register callbacks."""
-        async_dispatcher_connect(self.hass, SIGNAL_UPDATE_HAM, self._update_callback)
+        """Register to the coordinator, states of all HAM entities are published together."""
+        self.hass.data[DATA_HAM].get_coordinator().register(self)
 
-    @callback
-    def _update_callback(self):
-        """Call update method."""
-        self.async_schedule_update_ha_state(True)
+    async def async_will_remove_from_hass(self):
+        """Unregister from the coordinator."""
+        self.hass.data[DATA_HAM].get_coordinator().unregister(self)
 
     def update(self):
         """Get the latest data."""
+        self.refresh(self.hass.data[DATA_HAM].get_snapshot())
+
+    def refresh(self, snapshot):
+        """Get the latest data of the snapshot, returns whether state or attributes were changed."""
+        state = self._state
+        attributes = self._attributes
+
         if self._data_provider_state is not None:
-            self._state = self._data_provider_state()
+            state = self._data_provider_state(snapshot)
         
         if self._data_provider_attributes is not None:
-            self._attributes = self._data_provider_attributes()
+            attributes = self._data_provider_attributes(snapshot)
+
+        is_changed = state != self._state or attributes != self._attributes
+
+        self._state = state
+        self._attributes = attributes
+
+        return is_changed
@@ -0,0 +1,38 @@
+"""Immutable snapshot of a HAM refresh."""
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerSnapshot:
+    """Immutable result of a single resolution cycle, replaced as a whole by reference."""
+    __slots__ = ['date_time', 'weekday', 'events_of_today', 'is_away', 'profile', 'part', 'scene',
+                 'occupancy_level', 'present_trackers', 'source', 'boundary']
+
+    def __init__(self, date_time=None, weekday=None, events_of_today=None, is_away=None,
+                 profile=None, part=None, scene=None, occupancy_level=None, present_trackers=None,
+                 source=None, boundary=None):
+        object.__setattr__(self, 'date_time', date_time)
+        object.__setattr__(self, 'weekday', weekday)
+        object.__setattr__(self, 'events_of_today', None if events_of_today is None else tuple(events_of_today))
+        object.__setattr__(self, 'is_away', is_away)
+        object.__setattr__(self, 'profile', profile)
+        object.__setattr__(self, 'part', part)
+        object.__setattr__(self, 'scene', scene)
+        object.__setattr__(self, 'occupancy_level', occupancy_level)
+        object.__setattr__(self, 'present_trackers', None if present_trackers is None else tuple(present_trackers))
+        object.__setattr__(self, 'source', source)
+        object.__setattr__(self, 'boundary', boundary)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __delattr__(self, key):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def is_changed(self, other):
+        """Whether profile, part, scene or away state differs from the other snapshot."""
+        return self.profile != other.profile or \
+            self.part != other.part or \
+            self.scene != other.scene or \
+            self.is_away != other.is_away
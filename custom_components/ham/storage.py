@@ -0,0 +1,81 @@
+"""Persistence of runtime changes of events and parts."""
+import asyncio
+import logging
+
+from homeassistant.helpers.storage import Store
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerStorage:
+    """Events and parts changed at runtime, stored in HA's .storage on top of the YAML configuration."""
+
+    def __init__(self, hass):
+        self._hass = hass
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._data = {
+            STORAGE_EVENTS: {},
+            STORAGE_REMOVED_EVENTS: [],
+            STORAGE_PARTS: {}
+        }
+
+    def load(self):
+        """Load stored data, must not be called from the event loop."""
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._store.async_load(), self._hass.loop)
+            data = future.result()
+
+            if data is not None:
+                self._data.update(data)
+        except Exception as ex:
+            _LOGGER.error('Failed to load stored HAM configuration, error: %s', ex)
+
+        return self._data
+
+    def add_event(self, event_id, event):
+        self._data[STORAGE_EVENTS][event_id] = event
+
+        if event_id in self._data[STORAGE_REMOVED_EVENTS]:
+            self._data[STORAGE_REMOVED_EVENTS].remove(event_id)
+
+        self.save()
+
+    def remove_event(self, event_id):
+        if event_id in self._data[STORAGE_EVENTS]:
+            del self._data[STORAGE_EVENTS][event_id]
+
+        if event_id not in self._data[STORAGE_REMOVED_EVENTS]:
+            self._data[STORAGE_REMOVED_EVENTS].append(event_id)
+
+        self.save()
+
+    def archive_event(self, event_id):
+        """Remove the past event (added at runtime) from the stored events, it was moved to the archive."""
+        if event_id in self._data[STORAGE_EVENTS]:
+            del self._data[STORAGE_EVENTS][event_id]
+
+            self.save()
+
+    def set_part(self, profile_name, part_name, part_from):
+        """Set part's from, None to remove the part."""
+        if profile_name not in self._data[STORAGE_PARTS]:
+            self._data[STORAGE_PARTS][profile_name] = {}
+
+        self._data[STORAGE_PARTS][profile_name][part_name] = part_from
+
+        self.save()
+
+    def save(self):
+        """Schedule a debounced save, changes made within the delay are written at once."""
+        self._hass.add_job(self._store.async_delay_save, self.get_data, STORAGE_SAVE_DELAY)
+
+    def get_data(self):
+        data = {
+            STORAGE_EVENTS: dict(self._data[STORAGE_EVENTS]),
+            STORAGE_REMOVED_EVENTS: list(self._data[STORAGE_REMOVED_EVENTS]),
+            STORAGE_PARTS: {profile_name: dict(parts) for profile_name, parts in self._data[STORAGE_PARTS].items()}
+        }
+
+        return data
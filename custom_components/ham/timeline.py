@@ -0,0 +1,139 @@
+"""Day parts timeline of a profile, compiled per date."""
+import logging
+import re
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+import homeassistant.util.dt as dt_util
+
+from .astronomy import get_sun_times
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+SUN_PART_FROM_PATTERN = re.compile(r'^(sunrise|sunset)(?:([+-])(\d{1,2}):(\d{2})(?::(\d{2}))?)?$')
+
+
+def parse_part_from(part_from):
+    """Parse part's from to a tuple of anchor (None for fixed time, sunrise or sunset) and time or offset."""
+    match = SUN_PART_FROM_PATTERN.match(part_from.strip().lower())
+
+    if match is None:
+        part_from_time = datetime.strptime(part_from, PART_FROM_FORMAT).time()
+
+        return None, part_from_time
+
+    anchor, sign, hours, minutes, seconds = match.groups()
+    offset = timedelta()
+
+    if sign is not None:
+        offset = timedelta(hours=int(hours), minutes=int(minutes), seconds=int(seconds or 0))
+
+        if sign == '-':
+            offset = -offset
+
+    return anchor, offset
+
+
+class HomeAutomationManagerTimeline:
+    """Sorted day parts of a profile, compiled once per day and resolved with a binary search."""
+
+    def __init__(self, profile_name, parts):
+        self._profile_name = profile_name
+        self._parts = parts
+        self._compiled_date = None
+        self._starts = []
+        self._names = []
+
+    def is_empty(self):
+        return len(self._parts) == 0
+
+    def get_parts(self):
+        return list(self._parts.keys())
+
+    def set_part(self, part_name, part_from):
+        """Set (add or update) part's from, timeline will be compiled again on next refresh."""
+        self._parts[part_name] = part_from
+        self._compiled_date = None
+
+    def remove_part(self, part_name):
+        self._parts.pop(part_name, None)
+        self._compiled_date = None
+
+    def compile(self, current_date, latitude, longitude):
+        """Resolve start time of each part for current_date, once per day."""
+        if self._compiled_date == current_date:
+            return
+
+        sun_times = None
+        entries = []
+
+        for part_name, (anchor, value) in self._parts.items():
+            part_from_time = value
+
+            if anchor is not None:
+                if sun_times is None:
+                    sunrise, sunset = get_sun_times(current_date, latitude, longitude)
+
+                    sun_times = {
+                        CONF_SUNRISE: sunrise,
+                        CONF_SUNSET: sunset
+                    }
+
+                anchor_time = sun_times[anchor]
+
+                if anchor_time is None:
+                    _LOGGER.warning('No %s at %s, skipping %s of %s',
+                                    anchor, current_date, part_name, self._profile_name)
+                    continue
+
+                part_from_time = (dt_util.as_local(anchor_time) + value).time()
+
+            entries.append((part_from_time, part_name))
+
+        entries.sort()
+
+        self._starts = [entry[0] for entry in entries]
+        self._names = [entry[1] for entry in entries]
+        self._compiled_date = current_date
+
+        _LOGGER.debug('Timeline of %s compiled for %s: %s', self._profile_name, current_date, entries)
+
+    def get_part(self, current_time):
+        """Return the part active at current_time, before the first part the last one (from yesterday) is active."""
+        if len(self._names) == 0:
+            return None
+
+        index = bisect_right(self._starts, current_time) - 1
+
+        return self._names[index]
+
+    def get_parts_between(self, start_date_time, end_date_time):
+        """Return the parts started after start_date_time until end_date_time (inclusive), by order."""
+        if len(self._names) == 0 or end_date_time <= start_date_time:
+            return []
+
+        start_index = bisect_right(self._starts, start_date_time.time())
+        end_index = bisect_right(self._starts, end_date_time.time())
+
+        if end_date_time - start_date_time >= timedelta(days=1):
+            return self._names[end_index:] + self._names[:end_index]
+
+        if start_date_time.date() == end_date_time.date():
+            return self._names[start_index:end_index]
+
+        return self._names[start_index:] + self._names[:end_index]
+
+    def get_next_boundary(self, current_date_time):
+        """
+        Return date and time of the next part start of the compiled day and the part, None when no more today.
+        Boundary is in the time zone of current_date_time (HA local time), the refresh reschedules it after DST change.
+        """
+        index = bisect_right(self._starts, current_date_time.time())
+
+        if index >= len(self._names):
+            return None, None
+
+        boundary = datetime.combine(current_date_time.date(), self._starts[index], tzinfo=current_date_time.tzinfo)
+
+        return boundary, self._names[index]
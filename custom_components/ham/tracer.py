@@ -0,0 +1,64 @@
+"""Sampled trace of HAM refresh cycles."""
+import json
+import logging
+from time import perf_counter
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerTraceSample:
+    """Structured trace of a single refresh, duration of each step in milliseconds."""
+
+    __slots__ = ['_data', '_steps', '_last_mark']
+
+    def __init__(self, refresh, source):
+        self._data = {
+            ATTR_TRACE_REFRESH: refresh,
+            ATTR_SOURCE: source
+        }
+        self._steps = {}
+        self._last_mark = perf_counter()
+
+    def mark(self, step):
+        """Complete the step, its duration is measured since the previous step."""
+        now = perf_counter()
+
+        self._steps[step] = round((now - self._last_mark) * 1000, 3)
+        self._last_mark = now
+
+    def set(self, key, value):
+        self._data[key] = value
+
+    def to_dict(self):
+        data = dict(self._data)
+
+        data[ATTR_TRACE_STEPS] = self._steps
+        data[ATTR_TRACE_DURATION] = round(sum(self._steps.values()), 3)
+
+        return data
+
+
+class HomeAutomationManagerTracer:
+    """Sample one refresh of every interval refreshes, nothing is collected when disabled."""
+
+    def __init__(self, interval):
+        self._interval = interval
+        self._refreshes = 0
+
+    def sample(self, source):
+        """Return a trace sample when the refresh is sampled, otherwise None."""
+        if self._interval == 0:
+            return None
+
+        self._refreshes += 1
+
+        if self._refreshes % self._interval != 0 or not _LOGGER.isEnabledFor(logging.INFO):
+            return None
+
+        return HomeAutomationManagerTraceSample(self._refreshes, source)
+
+    @staticmethod
+    def log(sample):
+        _LOGGER.info('Trace of refresh: %s', json.dumps(sample.to_dict(), default=str))
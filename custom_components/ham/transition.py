@@ -0,0 +1,88 @@
+"""Scheduling of day part transitions at their exact boundary."""
+import logging
+
+import homeassistant.util.dt as dt_util
+from homeassistant.helpers.event import track_point_in_time
+
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAutomationManagerTransitionScheduler:
+    """Prepare the scene of the next part shortly before its boundary, refresh exactly at the boundary."""
+
+    def __init__(self, hass, prepare_scene, refresh_at_boundary):
+        self._hass = hass
+        self._prepare_scene = prepare_scene
+        self._refresh_at_boundary = refresh_at_boundary
+        self._boundary = None
+        self._part = None
+        self._prepared_scene = None
+        self._prepared_script = None
+        self._remove_prepare_listener = None
+        self._remove_boundary_listener = None
+
+    def get_boundary(self):
+        return self._boundary
+
+    def schedule(self, boundary, part):
+        """Schedule preparation and refresh of the next boundary, previous schedule is cancelled."""
+        if boundary == self._boundary and part == self._part:
+            return
+
+        self.cancel()
+
+        if boundary is None:
+            return
+
+        self._boundary = boundary
+        self._part = part
+
+        prepare_time = boundary - TRANSITION_PREPARE_LEAD_TIME
+
+        if prepare_time <= dt_util.now():
+            self.prepare(prepare_time)
+        else:
+            self._remove_prepare_listener = track_point_in_time(self._hass, self.prepare, prepare_time)
+
+        self._remove_boundary_listener = track_point_in_time(self._hass, self.transit, boundary)
+
+        _LOGGER.debug('Transition to %s scheduled for %s', part, boundary)
+
+    def cancel(self):
+        """Cancel the scheduled listeners, prepared script is kept until used by its scene or prepared again."""
+        for remove_listener in [self._remove_prepare_listener, self._remove_boundary_listener]:
+            if remove_listener is not None:
+                remove_listener()
+
+        self._boundary = None
+        self._part = None
+        self._remove_prepare_listener = None
+        self._remove_boundary_listener = None
+
+    def prepare(self, event_time):
+        self._remove_prepare_listener = None
+
+        self._prepared_scene, self._prepared_script = self._prepare_scene(self._part)
+
+        _LOGGER.debug('Scene %s prepared for transition at %s', self._prepared_scene, self._boundary)
+
+    def transit(self, event_time):
+        boundary = self._boundary
+
+        self._remove_boundary_listener = None
+
+        self._refresh_at_boundary(boundary)
+
+    def pop_prepared_script(self, scene):
+        """Return the prepared script when it was prepared for the scene, script is used only once."""
+        script = None
+
+        if self._prepared_script is not None and self._prepared_scene == scene:
+            script = self._prepared_script
+
+            self._prepared_scene = None
+            self._prepared_script = None
+
+        return script